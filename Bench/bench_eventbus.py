@@ -0,0 +1,64 @@
+# Bench/bench_eventbus.py
+# 事件总线吞吐量基准：python -m Bench.bench_eventbus
+from dataclasses import dataclass
+from queue import Empty
+import threading
+import time
+
+from Core.EventBus import Event, EventBus
+
+
+@dataclass
+class TickEvent(Event):
+    symbol: str
+    price: float
+
+
+class LegacyEventBus(EventBus):
+    """原始分发循环：每个事件唤醒一次并查询subscriptions字典"""
+
+    def _dispatch(self):
+        while self.running:
+            try:
+                event = self.queue.get(timeout=0.1)
+                for handler in self.subscriptions.get(type(event), []):
+                    handler(event)
+            except Empty:
+                continue
+
+
+def run(bus: EventBus, n_events: int, n_handlers: int = 3) -> float:
+    """发布n_events个事件，返回从首个发布到全部处理完成的吞吐（事件/秒）"""
+    done = threading.Event()
+    counter = [0]
+    target = n_events * n_handlers
+
+    def handler(event):
+        counter[0] += 1
+        if counter[0] == target:
+            done.set()
+
+    for _ in range(n_handlers):
+        bus.subscribe(TickEvent, handler)
+    bus.start()
+
+    events = [TickEvent("GCJ5", 2000.0 + i % 10) for i in range(n_events)]
+    start = time.perf_counter()
+    for event in events:
+        bus.publish(event)
+    done.wait(timeout=60)
+    elapsed = time.perf_counter() - start
+    bus.stop()
+    return n_events / elapsed
+
+
+if __name__ == "__main__":
+    N = 200_000
+    cases = [
+        ("legacy loop", lambda: LegacyEventBus()),
+        ("per-event + table", lambda: EventBus()),
+        ("batched drain", lambda: EventBus(batch=True)),
+    ]
+    for name, factory in cases:
+        rate = run(factory(), N)
+        print(f"{name:<20s} {rate:>12,.0f} events/s")
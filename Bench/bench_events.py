@@ -0,0 +1,83 @@
+# Bench/bench_events.py
+# 事件记录的内存与单事件开销（改造前后对比）：python -m Bench.bench_events
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Tuple
+import time
+import timeit
+import tracemalloc
+
+from Core.EventBus import Event
+from Model.MarketData3 import MarketDataEvent
+from Model.SpreadCalculator import SpreadEvent
+
+
+# ---- 改造前的事件定义与热路径（字符串时间戳 + datetime） ----
+@dataclass
+class LegacyMarketDataEvent(Event):
+    symbol: str
+    price: float
+    time: str
+    tickType: int
+
+
+@dataclass
+class LegacySpreadEvent(Event):
+    spread: float
+    timestamp: datetime
+    symbol_pair: Tuple[str, str]
+    prices: Tuple[float, float]
+
+
+PAIR = ("GCJ5", "GCM5")
+NAME = "GCJ5-GCM5"
+
+
+def legacy_tick(market_data, server_ts: int, price: float):
+    event = LegacyMarketDataEvent("GCJ5", price, str(server_ts), 88)
+    timestamp = datetime.fromtimestamp(int(event.time) / 1000)
+    market_data[event.symbol] = {"price": event.price, "timestamp": timestamp}
+    data1, data2 = market_data[PAIR[0]], market_data[PAIR[1]]
+    if abs((data1["timestamp"] - data2["timestamp"]).total_seconds()) <= 2:
+        return LegacySpreadEvent(data1["price"] - data2["price"], datetime.now(), PAIR,
+                                 (data1["price"], data2["price"]))
+
+
+def compact_tick(market_data, server_ts: int, price: float):
+    event = MarketDataEvent.make("GCJ5", price, server_ts * 1_000_000_000, 88)
+    data = market_data[event.symbol]
+    data[0] = event.price
+    data[1] = event.ts_ns
+    price1, ts1 = market_data[PAIR[0]]
+    price2, ts2 = market_data[PAIR[1]]
+    if abs(ts1 - ts2) <= 2_000_000_000:
+        return SpreadEvent.make(price1 - price2, time.time_ns(), PAIR, (price1, price2), NAME)
+
+
+def memory_per_event(factory, n: int = 100_000) -> float:
+    tracemalloc.start()
+    events = [factory(i) for i in range(n)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del events
+    return size / n
+
+
+if __name__ == "__main__":
+    ts = int(time.time())
+    legacy_md = {PAIR[0]: {"price": 2000.0, "timestamp": datetime.fromtimestamp(ts)},
+                 PAIR[1]: {"price": 2010.0, "timestamp": datetime.fromtimestamp(ts)}}
+    compact_md = {PAIR[0]: [2000.0, ts * 1_000_000_000], PAIR[1]: [2010.0, ts * 1_000_000_000]}
+
+    N = 200_000
+    # make()只比frozen的__init__快，比旧的可变事件仍慢一些；收益在热路径和内存两项
+    print("构造开销（ns/事件）")
+    print(f"  legacy  MarketDataEvent: {timeit.timeit(lambda: LegacyMarketDataEvent('GCJ5', 1.0, str(ts), 88), number=N) / N * 1e9:8.0f}")
+    print(f"  frozen  MarketDataEvent: {timeit.timeit(lambda: MarketDataEvent('GCJ5', 1.0, ts, 88), number=N) / N * 1e9:8.0f}")
+    print(f"  make()  MarketDataEvent: {timeit.timeit(lambda: MarketDataEvent.make('GCJ5', 1.0, ts, 88), number=N) / N * 1e9:8.0f}")
+    print("热路径 tick->spread（ns/tick，时间戳解析 + 价差事件）")
+    print(f"  legacy: {timeit.timeit(lambda: legacy_tick(legacy_md, ts * 1000, 2001.0), number=N) / N * 1e9:8.0f}")
+    print(f"  compact: {timeit.timeit(lambda: compact_tick(compact_md, ts, 2001.0), number=N) / N * 1e9:7.0f}")
+    print("内存（字节/事件，含时间戳字符串/对象）")
+    print(f"  legacy  MarketDataEvent: {memory_per_event(lambda i: LegacyMarketDataEvent('GCJ5', 1.0 + i, str(ts + i), 88)):8.1f}")
+    print(f"  compact MarketDataEvent: {memory_per_event(lambda i: MarketDataEvent.make('GCJ5', 1.0 + i, (ts + i) * 1_000_000_000, 88)):8.1f}")
@@ -0,0 +1,53 @@
+# Bench/bench_inline.py
+# 行情->价差->信号链路延迟：异步队列 vs 内联订阅，python -m Bench.bench_inline
+from dataclasses import dataclass
+import threading
+import time
+
+from Core.EventBus import Event, EventBus
+from Core.Metrics import LatencyHistogram
+
+
+@dataclass
+class Tick(Event):
+    symbol: str
+    price: float
+    sent: int
+
+
+@dataclass
+class Spread(Event):
+    spread: float
+    sent: int
+
+
+def run(bus: EventBus, inline: bool, n_ticks: int) -> LatencyHistogram:
+    """每个tick计算一次价差，策略端记录从tick发布到收到价差的延迟"""
+    latency = LatencyHistogram()
+    last = {"A": 0.0, "B": 0.0}
+    received = threading.Semaphore(0)
+
+    def on_tick(event: Tick):
+        last[event.symbol] = event.price
+        bus.publish(Spread(last["A"] - last["B"], event.sent))
+
+    def on_spread(event: Spread):
+        latency.record(time.perf_counter_ns() - event.sent)
+        received.release()
+
+    bus.subscribe(Tick, on_tick, inline=inline)
+    bus.subscribe(Spread, on_spread, inline=inline)
+    bus.start()
+    for i in range(n_ticks):
+        # 逐个发布并等待信号，测量单条链路的端到端延迟
+        bus.publish(Tick("A" if i % 2 else "B", 2000.0 + i % 7, time.perf_counter_ns()))
+        received.acquire()
+    bus.stop()
+    return latency
+
+
+if __name__ == "__main__":
+    N = 20_000
+    for name, inline in (("async", False), ("inline", True)):
+        s = run(EventBus(batch=True), inline, N).summary()
+        print(f"{name:<7s} tick->signal p50={s['p50_us']:>8.1f}us p99={s['p99_us']:>8.1f}us max={s['max_us']:>9.1f}us")
@@ -0,0 +1,65 @@
+# Bench/bench_priority.py
+# 优先级lane排队延迟：python -m Bench.bench_priority
+from dataclasses import dataclass, field
+import threading
+import time
+
+from Core.EventBus import Event, EventBus, PRIORITY_HIGH, PRIORITY_LOW
+from Core.Metrics import LatencyHistogram
+
+
+@dataclass
+class QuoteEvent(Event):
+    price: float
+    sent: int = field(default_factory=time.perf_counter_ns)
+
+
+@dataclass
+class SignalEvent(Event):
+    direction: str
+    sent: int = field(default_factory=time.perf_counter_ns)
+
+
+def run(bus: EventBus, n_quotes: int, signal_every: int):
+    """行情洪峰中穿插信号，统计两类事件从发布到处理的延迟"""
+    latency = {QuoteEvent: LatencyHistogram(), SignalEvent: LatencyHistogram()}
+    done = threading.Event()
+    total = n_quotes + n_quotes // signal_every
+
+    def handler(event):
+        latency[type(event)].record(time.perf_counter_ns() - event.sent)
+        # 模拟每个事件约5微秒的处理开销
+        end = time.perf_counter_ns() + 5_000
+        while time.perf_counter_ns() < end:
+            pass
+        if sum(h.count for h in latency.values()) == total:
+            done.set()
+
+    bus.subscribe(QuoteEvent, handler)
+    bus.subscribe(SignalEvent, handler)
+    bus.start()
+    for i in range(n_quotes):
+        bus.publish(QuoteEvent(2000.0))
+        if i % signal_every == signal_every - 1:
+            bus.publish(SignalEvent("BUY"))
+    done.wait(timeout=120)
+    bus.stop()
+    return latency
+
+
+if __name__ == "__main__":
+    N, EVERY = 50_000, 500
+    cases = [
+        ("fifo", lambda: EventBus(batch=True)),
+        ("priority", lambda: EventBus(batch=True, max_batch=64,
+                                      priorities={SignalEvent: PRIORITY_HIGH, QuoteEvent: PRIORITY_LOW})),
+    ]
+    for name, factory in cases:
+        bus = factory()
+        latency = run(bus, N, EVERY)
+        for event_type, histogram in latency.items():
+            s = histogram.summary()
+            print(f"{name:<9s} {event_type.__name__:<12s} p50={s['p50_us']:>10.1f}us "
+                  f"p99={s['p99_us']:>10.1f}us max={s['max_us']:>10.1f}us")
+        if bus.priorities:
+            print(f"{'':<9s} queue delay by class: {bus.priority_stats()}")
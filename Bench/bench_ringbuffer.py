@@ -0,0 +1,76 @@
+# Bench/bench_ringbuffer.py
+# 环形缓冲 vs Queue 传输吞吐：python -m Bench.bench_ringbuffer
+from queue import Queue
+import threading
+import time
+
+from Core.EventBus import EventBus, RingEventBus
+from Core.RingBuffer import RingBuffer
+from Bench.bench_eventbus import TickEvent, run
+
+
+class TickSlot:
+    """预分配的可复用行情槽位"""
+    __slots__ = ("symbol", "price", "ts_ns")
+
+    def __init__(self):
+        self.symbol = ""
+        self.price = 0.0
+        self.ts_ns = 0
+
+
+def fill_tick(slot: TickSlot, symbol: str, price: float, ts_ns: int):
+    slot.symbol = symbol
+    slot.price = price
+    slot.ts_ns = ts_ns
+
+
+def raw_queue(n: int) -> float:
+    """裸Queue：每条行情一个元组"""
+    queue = Queue()
+    total = [0.0]
+
+    def consume():
+        for _ in range(n):
+            symbol, price, ts_ns = queue.get()
+            total[0] += price
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    start = time.perf_counter()
+    for i in range(n):
+        queue.put(("GCJ5", 2000.0, i))
+    consumer.join()
+    return n / (time.perf_counter() - start)
+
+
+def raw_ring(n: int) -> float:
+    """裸环形缓冲：槽位原地填写，无分配"""
+    ring = RingBuffer(1 << 16, factory=TickSlot)
+    consumer = ring.add_consumer()
+    total = [0.0]
+
+    def handle(slot: TickSlot):
+        total[0] += slot.price
+
+    def consume():
+        seen = 0
+        while seen < n:
+            seen += consumer.wait_poll(handle, 4096)
+
+    thread = threading.Thread(target=consume)
+    thread.start()
+    start = time.perf_counter()
+    publish_with = ring.publish_with
+    for i in range(n):
+        publish_with(fill_tick, "GCJ5", 2000.0, i)
+    thread.join()
+    return n / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    N = 500_000
+    print(f"{'raw Queue':<22s} {raw_queue(N):>12,.0f} events/s")
+    print(f"{'raw RingBuffer':<22s} {raw_ring(N):>12,.0f} events/s")
+    print(f"{'EventBus(batch)':<22s} {run(EventBus(batch=True), N):>12,.0f} events/s")
+    print(f"{'RingEventBus':<22s} {run(RingEventBus(), N):>12,.0f} events/s")
@@ -0,0 +1,55 @@
+# Bench/bench_spread_engine.py
+# 多合约对价差：每对一个SpreadCalculator vs 一个SpreadEngine；多腿结构批量重算，python -m Bench.bench_spread_engine
+import time
+
+from Core.EventBus import EventBus
+from Model.MarketData3 import MarketDataEvent
+from Model.SpreadCalculator import SpreadCalculator, SpreadEvent
+from Model.SpreadEngine import SpreadEngine
+
+
+def make_pairs(n_pairs: int):
+    """n_pairs个合约对，每个合约只出现在两个合约对里"""
+    symbols = [f"S{i}" for i in range(n_pairs)]
+    return symbols, [(symbols[i], symbols[(i + 1) % n_pairs]) for i in range(n_pairs)]
+
+
+def run(n_pairs: int, engine: bool, n_ticks: int = 50_000) -> float:
+    """所有订阅都内联执行，返回每个tick的耗时（微秒）"""
+    bus = EventBus()
+    symbols, pairs = make_pairs(n_pairs)
+    if engine:
+        SpreadEngine(bus, pairs, inline=True)
+    else:
+        for pair in pairs:
+            SpreadCalculator(bus, symbol_pair=pair, inline=True)
+    bus.subscribe(SpreadEvent, lambda e: None, inline=True)
+    t0 = time.time_ns()
+    begin = time.perf_counter()
+    for k in range(n_ticks):
+        bus.publish(MarketDataEvent.make(symbols[k % n_pairs], 2000.0 + k % 10, t0 + k, 88))
+    return (time.perf_counter() - begin) / n_ticks * 1e6
+
+
+if __name__ == "__main__":
+    for n_pairs in (2, 10, 50, 200):
+        calc = run(n_pairs, engine=False)
+        eng = run(n_pairs, engine=True)
+        print(f"{n_pairs:>4d}对  SpreadCalculator×{n_pairs}: {calc:>7.2f}us/tick  SpreadEngine: {eng:>6.2f}us/tick")
+
+    # 单条腿被几百个多腿结构共用时，一次更新重算全部相关结构（不计发布开销）
+    bus = EventBus()
+    legs = [f"L{i}" for i in range(40)]
+    engine = SpreadEngine(bus)
+    for i in range(300):
+        a, b, c = legs[0], legs[1 + i % 39], legs[1 + (i * 7 + 3) % 39]
+        engine.add_spread((a, b, c), (1, -2, 1), ratio=i % 5 == 0)
+    t0 = time.time_ns()
+    for k, symbol in enumerate(legs):
+        engine._update(symbol, 2000.0 + k, t0)
+    bus.publish = lambda event: None
+    n = 20_000
+    begin = time.perf_counter()
+    for k in range(n):
+        engine._update(legs[0], 2000.0 + k % 10, t0 + k)
+    print(f"300个三腿结构共用一条腿: {(time.perf_counter() - begin) / n * 1e6:.2f}us/更新（含构造300个事件）")
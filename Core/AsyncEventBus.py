@@ -0,0 +1,140 @@
+# Core/AsyncEventBus.py
+import asyncio
+import inspect
+from typing import Callable, Dict, List, Optional, Tuple
+
+from Core.EventBus import Event
+from Core.Log import get_logger
+
+log = get_logger("AsyncEventBus")
+
+
+class AsyncEventBus:
+    """asyncio事件总线
+
+    - 订阅者可以是普通函数或async函数，async处理器在所属lane内按顺序await；
+    - lanes>1时按keys中配置的key函数分片，同key有序，不同key并发；
+    - publish可await（队列有上限时形成背压），线程侧用publish_threadsafe投递到事件循环；
+      线程侧无法等待，队列满时丢弃该事件并计入dropped。
+    """
+
+    def __init__(self, lanes: int = 1, keys: Optional[Dict[type, Callable]] = None,
+                 maxsize: int = 0, max_batch: int = 1024):
+        self.subscriptions: Dict[type, list] = {}
+        self._handlers: Dict[type, Tuple[Tuple[Callable, bool], ...]] = {}
+        self._dispatch_table: Dict[type, Tuple[Tuple[Callable, bool], ...]] = {}
+        self.lanes = lanes
+        self.keys: Dict[type, Callable] = dict(keys or {})
+        self._key_cache: Dict[type, Optional[Callable]] = {}
+        self.maxsize = maxsize
+        self.max_batch = max_batch
+        self._queues: List[asyncio.Queue] = [asyncio.Queue(maxsize) for _ in range(lanes)]
+        self._tasks: List[asyncio.Task] = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.running = False
+        # 线程侧投递时因队列满丢弃的事件数
+        self.dropped = 0
+
+    def subscribe(self, event_type: type, callback: Callable):
+        """订阅事件类型（普通函数或async函数）"""
+        callbacks = self.subscriptions.setdefault(event_type, [])
+        callbacks.append(callback)
+        self._handlers[event_type] = tuple((cb, inspect.iscoroutinefunction(cb)) for cb in callbacks)
+        self._dispatch_table = {}
+
+    def handlers_for(self, event_type: type) -> Tuple[Tuple[Callable, bool], ...]:
+        """返回某事件类型的全部处理器（含父类订阅者），元素为(处理器, 是否async)"""
+        handlers = self._dispatch_table.get(event_type)
+        if handlers is None:
+            handlers = tuple(h for cls in event_type.__mro__ for h in self._handlers.get(cls, ()))
+            self._dispatch_table[event_type] = handlers
+        return handlers
+
+    def _queue_for(self, event: Event) -> asyncio.Queue:
+        if self.lanes == 1:
+            return self._queues[0]
+        event_type = type(event)
+        if event_type not in self._key_cache:
+            self._key_cache[event_type] = next(
+                (self.keys[cls] for cls in event_type.__mro__ if cls in self.keys), None)
+        key = self._key_cache[event_type]
+        return self._queues[0 if key is None else hash(key(event)) % self.lanes]
+
+    async def publish(self, event: Event):
+        """发布事件，队列满时等待"""
+        await self._queue_for(event).put(event)
+
+    def publish_nowait(self, event: Event):
+        """在事件循环线程内立即发布"""
+        self._queue_for(event).put_nowait(event)
+
+    def publish_or_drop(self, event: Event) -> bool:
+        """在事件循环线程内立即发布，队列满时丢弃、计数并记日志，返回是否入队"""
+        try:
+            self._queue_for(event).put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            log.warning("事件队列已满（maxsize=%d），丢弃%s，累计丢弃%d", self.maxsize, type(event).__name__,
+                        self.dropped)
+            return False
+
+    def publish_threadsafe(self, event: Event):
+        """从其他线程（如IB读线程）发布到事件循环；需先start()"""
+        loop = self.loop
+        if loop is None:
+            raise RuntimeError("AsyncEventBus未启动，publish_threadsafe需在start()之后调用")
+        loop.call_soon_threadsafe(self.publish_or_drop, event)
+
+    async def start(self):
+        """启动事件总线（需在事件循环内调用）"""
+        self.loop = asyncio.get_running_loop()
+        self.running = True
+        self._tasks = [
+            asyncio.create_task(self._run_lane(queue), name=f"AsyncEventBus-lane-{index}")
+            for index, queue in enumerate(self._queues)
+        ]
+
+    async def stop(self):
+        """停止事件总线，已入队的事件不再分发"""
+        self.running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run_lane(self, queue: asyncio.Queue):
+        while True:
+            batch = [await queue.get()]
+            # 一次唤醒取出已积压的事件
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            for event in batch:
+                for handler, is_async in self.handlers_for(type(event)):
+                    try:
+                        if is_async:
+                            await handler(event)
+                        else:
+                            handler(event)
+                    except Exception as e:
+                        log.exception("处理器 %s 异常: %r", getattr(handler, "__qualname__", handler), e)
+
+
+# ===== 调试代码 =====
+if __name__ == "__main__":
+    async def main():
+        bus = AsyncEventBus()
+
+        async def slow_handler(event: Event):
+            await asyncio.sleep(0.1)
+            print(f"[Debug] async handler: {event}")
+
+        bus.subscribe(Event, slow_handler)
+        bus.subscribe(Event, lambda e: print(f"[Debug] sync handler: {e}"))
+        await bus.start()
+        for _ in range(3):
+            await bus.publish(Event())
+        await asyncio.sleep(0.5)
+        await bus.stop()
+
+    asyncio.run(main())
@@ -1,29 +1,353 @@
-from dataclasses import dataclass
-from typing import Callable, Dict
+from dataclasses import fields
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from collections import deque
 from queue import Queue, Empty
 import threading
+import time
+
+from Core.Log import get_logger
+from Core.Metrics import BusStats, LatencyHistogram
+from Core.RingBuffer import RingBuffer, RingConsumer
+
+log = get_logger("EventBus")
+
+# 优先级：数值越小越先分发
+PRIORITY_HIGH = 0    # 订单、成交、交易信号
+PRIORITY_NORMAL = 1  # 未配置的事件类型
+PRIORITY_LOW = 2     # 行情
 
 
-@dataclass
 class Event:
-    """基础事件类"""
-    pass
+    """基础事件类
+
+    不带__slots__以外的任何状态，子类可以是普通dataclass，
+    也可以是dataclass(frozen=True, slots=True)的紧凑只读记录。
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+def fast_constructor(cls: type) -> Callable:
+    """为frozen+slots的dataclass事件生成快速构造函数
+
+    frozen dataclass的__init__逐字段走object.__setattr__，热路径上偏慢；
+    这里直接调用各slot描述符赋值，参数按字段顺序传入，不做默认值处理。
+    只比frozen的__init__快（约快一半），仍比普通可变dataclass的构造慢约两成（每个字段一次描述符调用）；
+    改用冻结记录换来的是不可变、内存更小和热路径上免去时间戳解析，而不是构造本身更快。
+    数字随Python版本变化，以Bench/bench_events.py的实测为准。
+    """
+    names = [f.name for f in fields(cls)]
+    namespace = {"_new": object.__new__, "_cls": cls}
+    namespace.update({f"_set_{name}": getattr(cls, name).__set__ for name in names})
+    body = "".join(f"    _set_{name}(self, {name})\n" for name in names)
+    exec(f"def make({', '.join(names)}):\n    self = _new(_cls)\n{body}    return self\n", namespace)
+    make = namespace["make"]
+    make.__qualname__ = f"{cls.__qualname__}.make"
+    return make
+
+
+class _Slot:
+    """合并队列中的占位项，持有同key最新的待分发事件"""
+    __slots__ = ("key", "item")
+
+    def __init__(self, key, item):
+        self.key = key
+        self.item = item
+
+
+class _LaneQueue(Queue):
+    """分发队列：对开启合并的事件类型，同key未分发的事件原地替换为最新值"""
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self._pending: Dict[tuple, _Slot] = {}
+        self.conflated: Dict[type, int] = {}
+        self.high_water = 0
+
+    def lag_histogram(self) -> Optional[LatencyHistogram]:
+        """入队到出队的延迟分布，未计时的队列返回None"""
+        return None
+
+    def _get(self):
+        item = self.queue.popleft()
+        if type(item) is _Slot:
+            del self._pending[item.key]
+            return item.item
+        return item
+
+    def put_latest(self, key: tuple, item):
+        """按key合并入队，key[0]为事件类型"""
+        with self.mutex:
+            slot = self._pending.get(key)
+            if slot is not None:
+                slot.item = item
+                self.conflated[key[0]] = self.conflated.get(key[0], 0) + 1
+                return
+            slot = self._pending[key] = _Slot(key, item)
+            self._put(slot)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+
+class _TimedLaneQueue(_LaneQueue):
+    """带计时的分发队列：记录每个事件的发布时间、排队延迟与队列深度高水位"""
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self.lag = LatencyHistogram()
+
+    def lag_histogram(self) -> Optional[LatencyHistogram]:
+        return self.lag
+
+    def _put(self, item):
+        self.queue.append((time.perf_counter_ns(), item))
+        if len(self.queue) > self.high_water:
+            self.high_water = len(self.queue)
+
+    def _get(self):
+        published, item = self.queue.popleft()
+        self.lag.record(time.perf_counter_ns() - published)
+        if type(item) is _Slot:
+            del self._pending[item.key]
+            return item.item
+        return item
+
+
+class _PriorityLaneQueue(_LaneQueue):
+    """按优先级分层的分发队列
+
+    每层一个FIFO，取出时先取最高优先级；高优先级连续分发max_burst个而低优先级仍有积压时，
+    让出一次给下一层非空队列，防止行情被信号/订单完全饿死。同时按优先级记录排队延迟。
+    """
+
+    def __init__(self, level_of: Callable, max_burst: int):
+        self._level_of = level_of
+        self._max_burst = max_burst
+        super().__init__()
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self._levels = [deque() for _ in range(PRIORITY_LOW + 1)]
+        # 最近一次分发所在层及该层连续分发的个数
+        self._burst_level = 0
+        self._burst = 0
+        self.delays = [LatencyHistogram() for _ in self._levels]
+        self.promoted = 0
+
+    def _qsize(self):
+        return sum(map(len, self._levels))
+
+    def lag_histogram(self) -> Optional[LatencyHistogram]:
+        merged = LatencyHistogram()
+        for histogram in self.delays:
+            merged.merge(histogram)
+        return merged
+
+    def _put(self, item):
+        event = item.item if type(item) is _Slot else item
+        self._levels[self._level_of(event)].append((time.perf_counter_ns(), item))
+        depth = self._qsize()
+        if depth > self.high_water:
+            self.high_water = depth
+
+    def _get(self):
+        levels = self._levels
+        chosen = next(level for level, lane in enumerate(levels) if lane)
+        if chosen != self._burst_level:
+            # 换了一层（上层已取空或刚让出过），重新计数
+            self._burst_level = chosen
+            self._burst = 0
+        if self._burst >= self._max_burst:
+            lower = next((level for level in range(chosen + 1, len(levels)) if levels[level]), None)
+            self._burst = 0
+            if lower is not None:
+                chosen = lower
+                self._burst_level = lower
+                self.promoted += 1
+        elif chosen < len(levels) - 1:
+            self._burst += 1
+        enqueued, item = levels[chosen].popleft()
+        self.delays[chosen].record(time.perf_counter_ns() - enqueued)
+        if type(item) is _Slot:
+            del self._pending[item.key]
+            return item.item
+        return item
+
+
+def _drain(queue: Queue, first, max_batch: int) -> List:
+    """一次加锁取出队列中已积压的事件（最多max_batch个）"""
+    batch = [first]
+    with queue.mutex:
+        n = min(queue._qsize(), max_batch - 1)
+        if n > 0:
+            get = queue._get
+            batch.extend([get() for _ in range(n)])
+            queue.not_full.notify_all()
+    return batch
 
 
 class EventBus:
-    def __init__(self):
+    def __init__(self, batch: bool = False, max_batch: int = 1024,
+                 priorities: Optional[Dict[type, int]] = None, max_burst: int = 32,
+                 instrument: bool = False):
         self.subscriptions: Dict[type, list] = {}
-        self.queue = Queue()
-        self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        # 订阅时冻结的处理器元组（按精确类型）
+        self._handlers: Dict[type, Tuple[Callable, ...]] = {}
+        # 按事件类型MRO解析后的分发表，订阅变化时整体替换
+        self._dispatch_table: Dict[type, Tuple[Callable, ...]] = {}
+        # 内联订阅者：在发布线程上同步执行，不经过队列
+        self.inline_subscriptions: Dict[type, list] = {}
+        self._inline_handlers: Dict[type, Tuple[Callable, ...]] = {}
+        self._inline_table: Dict[type, Tuple[Callable, ...]] = {}
+        self._sub_lock = threading.Lock()
+        # 开启合并的事件类型 -> key函数
+        self._conflate_keys: Dict[type, Callable] = {}
+        # 事件类型 -> 优先级；为空时使用普通FIFO
+        self.priorities: Dict[type, int] = dict(priorities or {})
+        self.max_burst = max_burst
+        self._level_cache: Dict[type, int] = {}
+        # 运行统计：排队延迟、处理器耗时、队列高水位、各类型事件速率
+        self.instrument = instrument
+        self._stats: Optional[BusStats] = BusStats() if instrument else None
+        if instrument:
+            self._call = self._timed_call
+        self.queue = self._new_queue()
+        self.batch = batch
+        self.max_batch = max_batch
+        target = self._dispatch_batch if batch else self._dispatch
+        self.dispatcher = threading.Thread(target=target, daemon=True)
         self.running = False
 
-    def subscribe(self, event_type: type, callback: Callable):
-        """订阅事件类型"""
-        self.subscriptions.setdefault(event_type, []).append(callback)
+    def subscribe(self, event_type: type, callback: Callable, lane: Union[int, str, None] = None,
+                  inline: bool = False):
+        """订阅事件类型
+
+        inline=True时处理器直接在发布线程（如IB读线程）上执行，省去入队和线程切换；
+        处理器必须足够快且线程安全。lane仅对ShardedEventBus的非内联订阅者生效。
+        """
+        with self._sub_lock:
+            if inline:
+                callbacks = self.inline_subscriptions.setdefault(event_type, [])
+                callbacks.append(callback)
+                self._inline_handlers[event_type] = tuple(callbacks)
+            else:
+                callbacks = self.subscriptions.setdefault(event_type, [])
+                callbacks.append(callback)
+                self._handlers[event_type] = tuple(callbacks)
+            self._dispatch_table = {}
+            self._inline_table = {}
+
+    def handlers_for(self, event_type: type) -> Tuple[Callable, ...]:
+        """返回某事件类型的全部处理器（含父类订阅者）"""
+        handlers = self._dispatch_table.get(event_type)
+        if handlers is None:
+            handlers = self._resolve(event_type)
+        return handlers
+
+    def _resolve(self, event_type: type) -> Tuple[Callable, ...]:
+        """沿MRO合并处理器并写入分发表，每种类型只解析一次"""
+        with self._sub_lock:
+            mro = event_type.__mro__
+            handlers = tuple(handler for cls in mro for handler in self._handlers.get(cls, ()))
+            self._dispatch_table[event_type] = handlers
+            self._inline_table[event_type] = tuple(
+                handler for cls in mro for handler in self._inline_handlers.get(cls, ())
+            )
+        return handlers
+
+    def _publish_inline(self, event: Event):
+        """在当前线程上执行内联处理器"""
+        handlers = self._inline_table.get(type(event))
+        if handlers is None:
+            self._resolve(type(event))
+            handlers = self._inline_table.get(type(event), ())
+        for handler in handlers:
+            self._call(handler, event)
+
+    def conflate(self, event_type: type, key: Callable):
+        """对事件类型开启最新值合并：同key尚未分发的旧事件被新事件原地替换"""
+        with self._sub_lock:
+            self._conflate_keys[event_type] = key
+
+    def conflation_stats(self) -> Dict[str, object]:
+        """合并计数：各事件类型被合并掉的事件数，以及当前待分发的合并槽数"""
+        conflated: Dict[str, int] = {}
+        pending = 0
+        for queue in self._lane_queues():
+            with queue.mutex:
+                for event_type, count in queue.conflated.items():
+                    conflated[event_type.__name__] = conflated.get(event_type.__name__, 0) + count
+                pending += len(queue._pending)
+        return {"conflated": conflated, "pending": pending}
+
+    def priority_stats(self) -> Dict[str, object]:
+        """各优先级的排队延迟（入队到出队）与防饿死让出次数"""
+        delays = [LatencyHistogram() for _ in range(PRIORITY_LOW + 1)]
+        promoted = 0
+        for queue in self._lane_queues():
+            if isinstance(queue, _PriorityLaneQueue):
+                for total, histogram in zip(delays, queue.delays):
+                    total.merge(histogram)
+                promoted += queue.promoted
+        return {"delays": [histogram.summary() for histogram in delays], "promoted": promoted}
+
+    def stats(self) -> Dict[str, object]:
+        """运行统计快照（需instrument=True）
+
+        events: 各类型事件数、自上次查询以来的速率与平均速率；
+        lag: 发布到出队的排队延迟；handlers: 各处理器执行耗时（微秒，含p50/p99/max）；
+        lanes: 各分发队列当前深度与高水位。
+        """
+        if self._stats is None:
+            return {}
+        lag = LatencyHistogram()
+        lanes = []
+        for queue in self._lane_queues():
+            histogram = queue.lag_histogram()
+            if histogram is not None:
+                lag.merge(histogram)
+            lanes.append({"depth": queue.qsize(), "high_water": queue.high_water})
+        return {
+            "events": self._stats.rates(),
+            "lag": lag.summary(),
+            "handlers": self._stats.handler_summary(),
+            "lanes": lanes,
+        }
+
+    def _new_queue(self) -> _LaneQueue:
+        if self.priorities:
+            return _PriorityLaneQueue(self._level_of, self.max_burst)
+        if self.instrument:
+            return _TimedLaneQueue()
+        return _LaneQueue()
+
+    def _level_of(self, event) -> int:
+        """事件 -> 优先级，沿MRO查找并缓存"""
+        event_type = type(event)
+        level = self._level_cache.get(event_type)
+        if level is None:
+            level = next((self.priorities[cls] for cls in event_type.__mro__ if cls in self.priorities),
+                         PRIORITY_NORMAL)
+            self._level_cache[event_type] = level
+        return level
+
+    def _lane_queues(self) -> List[_LaneQueue]:
+        return [self.queue]
 
     def publish(self, event: Event):
-        """发布事件"""
-        self.queue.put(event)
+        """发布事件：先同步执行内联处理器，有异步处理器时再入队"""
+        if self._stats is not None:
+            self._stats.on_publish(type(event))
+        self._publish_inline(event)
+        if not self.handlers_for(type(event)):
+            return
+        key = self._conflate_keys.get(type(event))
+        if key is None:
+            self.queue.put(event)
+        else:
+            self.queue.put_latest((type(event), key(event)), event)
 
     def start(self):
         """启动事件总线"""
@@ -39,12 +363,265 @@ class EventBus:
         while self.running:
             try:
                 event = self.queue.get(timeout=0.1)
-                for handler in self.subscriptions.get(type(event), []):
-                    handler(event)
             except Empty:
                 continue
+            for handler in self.handlers_for(type(event)):
+                self._call(handler, event)
+
+    def _dispatch_batch(self):
+        """批量模式：一次唤醒取空队列，再逐个分发"""
+        queue = self.queue
+        while self.running:
+            try:
+                first = queue.get(timeout=0.1)
+            except Empty:
+                continue
+            table = self._dispatch_table
+            for event in _drain(queue, first, self.max_batch):
+                handlers = table.get(type(event))
+                if handlers is None:
+                    handlers = self._resolve(type(event))
+                for handler in handlers:
+                    self._call(handler, event)
+
+    @staticmethod
+    def _call(handler: Callable, event: Event):
+        """执行处理器，异常不终止分发线程"""
+        try:
+            handler(event)
+        except Exception as e:
+            log.exception("处理器 %s 异常: %r", getattr(handler, "__qualname__", handler), e)
+
+    def _timed_call(self, handler: Callable, event: Event):
+        """计时版_call，instrument=True时替换_call"""
+        start = time.perf_counter_ns()
+        try:
+            handler(event)
+        except Exception as e:
+            log.exception("处理器 %s 异常: %r", getattr(handler, "__qualname__", handler), e)
+        self._stats.handler_histogram(handler).record(time.perf_counter_ns() - start)
+
+
+class ShardedEventBus(EventBus):
+    """多分发线程事件总线
+
+    - 未指定lane的订阅者按key分片：同一key（如合约代码）的事件始终落在同一lane，保证有序；
+      不同key在不同lane上并行处理。事件类型没有配置key时统一落在lane 0。
+    - lane为int时固定在该编号的分片lane上；lane为str时使用独立的命名lane（如"gui"、"strategy"），
+      各订阅方互不阻塞。
+    """
+
+    def __init__(self, lanes: int = 4, keys: Optional[Dict[type, Callable]] = None, max_batch: int = 1024,
+                 priorities: Optional[Dict[type, int]] = None, max_burst: int = 32, instrument: bool = False):
+        super().__init__(batch=True, max_batch=max_batch, priorities=priorities, max_burst=max_burst,
+                         instrument=instrument)
+        self.lanes = lanes
+        self.keys: Dict[type, Callable] = dict(keys or {})
+        self._queues: List[_LaneQueue] = [self._new_queue() for _ in range(lanes)]
+        self._named: Dict[str, _LaneQueue] = {}
+        self._placements: Dict[type, List[Tuple[Callable, Union[int, str, None]]]] = {}
+        # 路由缓存：type -> (key函数, 分片处理器, ((队列, 固定lane处理器), ...))
+        self._routes: Dict[type, tuple] = {}
+        self._threads: List[threading.Thread] = []
+
+    def set_key(self, event_type: type, key: Callable):
+        """设置事件类型的分片key函数"""
+        with self._sub_lock:
+            self.keys[event_type] = key
+            self._routes = {}
+
+    def subscribe(self, event_type: type, callback: Callable, lane: Union[int, str, None] = None,
+                  inline: bool = False):
+        """订阅事件类型，可指定lane或内联执行"""
+        if inline:
+            super().subscribe(event_type, callback, inline=True)
+            return
+        with self._sub_lock:
+            self._placements.setdefault(event_type, []).append((callback, lane))
+            if isinstance(lane, str) and lane not in self._named:
+                queue = self._named[lane] = self._new_queue()
+                if self.running:
+                    self._start_lane(queue, lane)
+            self._routes = {}
+        super().subscribe(event_type, callback)
+
+    def publish(self, event: Event):
+        """发布事件：内联处理器同步执行，分片处理器进入key对应的lane，固定lane处理器进入各自lane"""
+        if self._stats is not None:
+            self._stats.on_publish(type(event))
+        self._publish_inline(event)
+        route = self._routes.get(type(event))
+        if route is None:
+            route = self._route(type(event))
+        key, keyed, pinned = route
+        conflate = self._conflate_keys.get(type(event))
+        if conflate is not None:
+            latest = conflate(event)
+        # 合并key带上处理器组：固定lane与分片lane是同一个队列时，两组处理器的事件互不覆盖
+        if keyed:
+            queue = self._queues[0] if key is None else self._queues[hash(key(event)) % self.lanes]
+            if conflate is None:
+                queue.put((event, keyed))
+            else:
+                queue.put_latest((type(event), latest, id(keyed)), (event, keyed))
+        for queue, handlers in pinned:
+            if conflate is None:
+                queue.put((event, handlers))
+            else:
+                queue.put_latest((type(event), latest, id(handlers)), (event, handlers))
+
+    def _level_of(self, item) -> int:
+        return super()._level_of(item[0])
+
+    def _lane_queues(self) -> List[_LaneQueue]:
+        with self._sub_lock:
+            return self._queues + list(self._named.values())
+
+    def _route(self, event_type: type) -> tuple:
+        with self._sub_lock:
+            mro = event_type.__mro__
+            keyed = []
+            pinned: Dict[int, Tuple[_LaneQueue, list]] = {}
+            for cls in mro:
+                for callback, lane in self._placements.get(cls, ()):
+                    if lane is None:
+                        keyed.append(callback)
+                        continue
+                    queue = self._named[lane] if isinstance(lane, str) else self._queues[lane % self.lanes]
+                    pinned.setdefault(id(queue), (queue, []))[1].append(callback)
+            key = next((self.keys[cls] for cls in mro if cls in self.keys), None)
+            route = (key, tuple(keyed), tuple((queue, tuple(handlers)) for queue, handlers in pinned.values()))
+            self._routes[event_type] = route
+        return route
+
+    def start(self):
+        """启动全部lane"""
+        self.running = True
+        for index, queue in enumerate(self._queues):
+            self._start_lane(queue, f"lane-{index}")
+        with self._sub_lock:
+            for name, queue in self._named.items():
+                self._start_lane(queue, name)
+
+    def stop(self):
+        """停止全部lane"""
+        self.running = False
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _start_lane(self, queue: _LaneQueue, name: str):
+        thread = threading.Thread(target=self._run_lane, args=(queue,), name=f"EventBus-{name}", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def _run_lane(self, queue: _LaneQueue):
+        call = self._call
+        while self.running:
+            try:
+                first = queue.get(timeout=0.1)
+            except Empty:
+                continue
+            for event, handlers in _drain(queue, first, self.max_batch):
+                for handler in handlers:
+                    call(handler, event)
+
+
+
+
+
+
+class RingEventBus(EventBus):
+    """以预分配环形缓冲为传输的事件总线
+
+    发布只写入复用的槽位并推进序号，没有Queue的锁与条件变量切换；分发线程按批读取。
+    还可以通过add_consumer()挂接其他消费者（如落盘线程），各自维护读序号读取同一事件流。
+    合并（conflate）与优先级不适用于该传输。
+    处理器内再发布（分发线程自身发布）时不等待缓冲空位，先放进旁路队列，本批处理完后再写入缓冲，
+    否则缓冲满时分发线程会等待自己的读序号而死锁。
+    multi_producer=False时只允许一个线程发布（含处理器内再发布），其他线程发布会直接报错。
+    """
+
+    def __init__(self, size: int = 65536, max_batch: int = 1024, multi_producer: bool = True,
+                 instrument: bool = False):
+        super().__init__(batch=True, max_batch=max_batch, instrument=instrument)
+        self.ring = RingBuffer(size, multi_producer=multi_producer)
+        self.multi_producer = multi_producer
+        self._producer: Optional[int] = None
+        self._consumer = self.ring.add_consumer()
+        self._lag = LatencyHistogram()
+        self._high_water = 0
+        # 分发线程内发布、尚未写入缓冲的事件
+        self._reentrant: deque = deque()
+        self.dispatcher = threading.Thread(target=self._dispatch_ring, daemon=True)
+
+    def add_consumer(self) -> RingConsumer:
+        """新增独立消费者"""
+        return self.ring.add_consumer()
+
+    def publish(self, event: Event):
+        """发布事件：先执行内联处理器，再写入环形缓冲"""
+        ident = threading.get_ident()
+        if not self.multi_producer:
+            if self._producer is None:
+                self._producer = ident
+            elif self._producer != ident:
+                raise RuntimeError("RingEventBus(multi_producer=False)只允许单线程发布")
+        if self._stats is not None:
+            self._stats.on_publish(type(event))
+        self._publish_inline(event)
+        ts_ns = time.perf_counter_ns() if self._stats is not None else 0
+        if ident == self.dispatcher.ident:
+            self._reentrant.append((event, ts_ns))
+        elif self._stats is None:
+            self.ring.publish(event)
+        else:
+            self.ring.publish_with(_fill_timed, event, ts_ns)
+
+    def _drain_reentrant(self):
+        """把分发线程内发布的事件写入缓冲，写满即停，剩余的下一批后再写"""
+        pending = self._reentrant
+        try_publish = self.ring.try_publish_with
+        while pending:
+            event, ts_ns = pending[0]
+            if not try_publish(_fill_timed, event, ts_ns):
+                return
+            pending.popleft()
+
+    def stats(self) -> Dict[str, object]:
+        result = super().stats()
+        if result:
+            result["lag"] = self._lag.summary()
+            result["lanes"] = [{"depth": self._consumer.available(), "high_water": self._high_water}]
+        return result
+
+    def _lane_queues(self) -> List[_LaneQueue]:
+        return []
+
+    def _dispatch_ring(self):
+        table_of = self.handlers_for
+        call = self._call
+        lag = self._lag if self.instrument else None
+
+        def dispatch(slot):
+            event = slot.event
+            if lag is not None:
+                lag.record(time.perf_counter_ns() - slot.ts_ns)
+            for handler in table_of(type(event)):
+                call(handler, event)
+
+        while self.running:
+            if lag is not None and self._consumer.available() > self._high_water:
+                self._high_water = self._consumer.available()
+            # 旁路队列有积压时不阻塞等待，尽快再尝试写入
+            self._consumer.wait_poll(dispatch, self.max_batch, timeout=0 if self._reentrant else 0.1)
+            if self._reentrant:
+                self._drain_reentrant()
 
 
+def _fill_timed(slot, event: Event, ts_ns: int):
+    slot.event = event
+    slot.ts_ns = ts_ns
 
 
 # ===== 调试代码 =====
@@ -0,0 +1,180 @@
+# Core/Log.py
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+ROOT = "TradeSpread"
+_FORMAT = "%(asctime)s.%(msecs)03d %(levelname)s [%(threadName)s] %(name)s: %(message)s"
+
+_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_atexit_registered = False
+
+
+class RateLimitFilter(logging.Filter):
+    """重复日志限流：同一位置的同一条消息（模板和参数都相同）每interval秒最多放行burst条
+
+    参数不同的消息（如不同错误码的IB错误）各自计数，互不抑制。
+    在调用线程上执行，被限流的记录不格式化、不入队；恢复放行时在消息后附上被抑制的条数。
+    多个发布线程同时记日志，窗口表加锁；条目超过max_keys时先清掉已过期的窗口，仍超出则整体清空。
+    """
+
+    def __init__(self, interval: float = 1.0, burst: int = 5, max_keys: int = 4096):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.max_keys = max_keys
+        # (logger名, 行号, 消息模板, 参数) -> [窗口起点, 窗口内条数, 被抑制条数]
+        self._windows: Dict[Tuple[str, int, str], list] = {}
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.lineno, record.msg, record.args)
+        try:
+            hash(key)
+        except TypeError:  # 参数里有list/dict等不可哈希的对象
+            key = (record.name, record.lineno, record.msg, repr(record.args))
+        with self._lock:
+            return self._filter(key, record)
+
+    def _filter(self, key: tuple, record: logging.LogRecord) -> bool:
+        now = record.created
+        window = self._windows.get(key)
+        if window is None:
+            if len(self._windows) >= self.max_keys:
+                self._prune(now)
+            self._windows[key] = [now, 1, 0]
+            return True
+        if now - window[0] >= self.interval:
+            if window[2]:
+                record.msg = f"{record.msg} (已抑制{window[2]}条重复日志)"
+            window[0], window[1], window[2] = now, 1, 0
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        self.suppressed += 1
+        return False
+
+    def _prune(self, now: float):
+        expired = [key for key, window in self._windows.items() if now - window[0] >= self.interval]
+        for key in expired:
+            del self._windows[key]
+        if len(self._windows) >= self.max_keys:
+            self._windows.clear()
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """把格式化推迟到后台线程：调用线程只做一次入队"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _LazyHandler(logging.Handler):
+    """未调用setup_logging时的占位handler：第一条日志到达时才按默认参数初始化并转交
+
+    import模块时只挂上它，不启动后台线程。
+    """
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        _configure()
+        for handler in logging.getLogger(ROOT).handlers:
+            if handler is not self:
+                handler.handle(record)
+        return True
+
+
+def _install_lazy():
+    root = logging.getLogger(ROOT)
+    root.setLevel(os.environ.get("TRADESPREAD_LOG_LEVEL", "INFO").upper())
+    root.propagate = False
+    root.handlers = [_LazyHandler()]
+
+
+def setup_logging(level: Optional[str] = None, interval: float = 1.0, burst: int = 5, stream=None):
+    """初始化日志：调用线程只入队，由后台线程写出
+
+    入口处显式调用；之前已有日志按默认配置初始化过时按新参数重新配置。
+    level默认取环境变量TRADESPREAD_LOG_LEVEL，未设置时为INFO。
+    """
+    shutdown_logging()
+    _configure(level, interval, burst, stream)
+
+
+def _configure(level: Optional[str] = None, interval: float = 1.0, burst: int = 5, stream=None):
+    global _listener, _atexit_registered
+    with _lock:
+        if _listener is not None:
+            return
+        root = logging.getLogger(ROOT)
+        root.setLevel((level or os.environ.get("TRADESPREAD_LOG_LEVEL", "INFO")).upper())
+        root.propagate = False
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(logging.Formatter(_FORMAT, datefmt="%H:%M:%S"))
+        records = queue.SimpleQueue()
+        handler = _DeferredQueueHandler(records)
+        handler.addFilter(RateLimitFilter(interval, burst))
+        # 整体替换列表：正在遍历旧列表的_LazyHandler调用不会重复分发
+        root.handlers = [handler]
+
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+        if not _atexit_registered:
+            atexit.register(shutdown_logging)
+            _atexit_registered = True
+
+
+def shutdown_logging():
+    """停止后台写出线程并刷新剩余日志"""
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+        root = logging.getLogger(ROOT)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+
+def set_level(level: str):
+    """运行时调整日志级别"""
+    logging.getLogger(ROOT).setLevel(level.upper())
+
+
+def get_logger(name: str) -> logging.Logger:
+    """获取TradeSpread下的子logger
+
+    热路径用%格式参数（log.debug("价差 %s", spread)），级别未开启时不做任何格式化；
+    构造参数本身也有开销时先判断log.isEnabledFor(logging.DEBUG)。
+    不做初始化：入口处调用setup_logging()，否则第一条日志到达时按默认参数初始化。
+    """
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+_install_lazy()
+
+
+# ===== 调试代码 =====
+if __name__ == "__main__":
+    setup_logging("DEBUG")
+    log = get_logger("Debug")
+    for i in range(20):
+        log.debug("重复消息 %d", i)
+        time.sleep(0.1)
+    disabled = get_logger("Debug")
+    set_level("INFO")
+    start = time.perf_counter()
+    for i in range(100_000):
+        disabled.debug("关闭时的开销 %s", i)
+    print(f"DEBUG关闭时每次调用 {(time.perf_counter() - start) / 100_000 * 1e9:.0f}ns")
@@ -0,0 +1,140 @@
+# Core/Metrics.py
+import time
+from collections import Counter
+from typing import Callable, Dict, List
+
+_SUB_BITS = 3
+_SUB = 1 << _SUB_BITS
+
+
+def _bucket(value: int) -> int:
+    """纳秒值 -> 桶号：每个2的幂区间再细分8个子桶"""
+    exp = value.bit_length() - 1
+    if exp < _SUB_BITS:
+        return value if value > 0 else 0
+    return ((exp - _SUB_BITS + 1) << _SUB_BITS) + ((value >> (exp - _SUB_BITS)) & (_SUB - 1))
+
+
+def _bucket_upper(index: int) -> int:
+    """桶号 -> 桶内上界（纳秒）"""
+    if index < _SUB:
+        return index
+    exp = (index >> _SUB_BITS) + _SUB_BITS - 1
+    width = 1 << (exp - _SUB_BITS)
+    return ((_SUB + (index & (_SUB - 1))) << (exp - _SUB_BITS)) + width - 1
+
+
+class LatencyHistogram:
+    """对数分桶延迟直方图（纳秒）
+
+    记录为O(1)且无内存分配，分位数相对误差约12%，适合常开。
+    仅在单个线程中record，读取统计时不加锁（读到的是近似快照）。
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (64 << _SUB_BITS)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns: int):
+        # 热路径：内联_bucket的计算
+        if ns < _SUB:
+            if ns < 0:
+                ns = 0
+            self.counts[ns] += 1
+        else:
+            shift = ns.bit_length() - 1 - _SUB_BITS
+            self.counts[((shift + 1) << _SUB_BITS) + ((ns >> shift) & (_SUB - 1))] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def merge(self, other: "LatencyHistogram"):
+        counts = self.counts
+        for index, n in enumerate(other.counts):
+            if n:
+                counts[index] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p: float) -> int:
+        """返回p分位（0~100）的纳秒值上界"""
+        if self.count == 0:
+            return 0
+        rank = max(1, int(self.count * p / 100.0 + 0.5))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(_bucket_upper(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        """统计摘要（微秒）"""
+        if self.count == 0:
+            return {"count": 0, "mean_us": 0.0, "p50_us": 0.0, "p99_us": 0.0, "max_us": 0.0}
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count / 1000,
+            "p50_us": self.percentile(50) / 1000,
+            "p99_us": self.percentile(99) / 1000,
+            "max_us": self.max / 1000,
+        }
+
+
+class BusStats:
+    """事件总线运行统计：各类型事件数与速率、各处理器耗时
+
+    计数与记录均无锁，多线程下为近似值，开销为每次调用几百纳秒，可常开。
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counts: Dict[type, int] = {}
+        self.handlers: Dict[Callable, LatencyHistogram] = {}
+        self._last_counts: Dict[type, int] = {}
+        self._last_time = self.started
+
+    def on_publish(self, event_type: type):
+        self.counts[event_type] = self.counts.get(event_type, 0) + 1
+
+    def handler_histogram(self, handler: Callable) -> LatencyHistogram:
+        histogram = self.handlers.get(handler)
+        if histogram is None:
+            histogram = self.handlers.setdefault(handler, LatencyHistogram())
+        return histogram
+
+    def rates(self) -> Dict[str, Dict[str, float]]:
+        """各类型事件总数、自上次查询以来的速率与平均速率（事件/秒）"""
+        now = time.monotonic()
+        interval = max(now - self._last_time, 1e-9)
+        uptime = max(now - self.started, 1e-9)
+        counts = dict(self.counts)
+        result = {
+            event_type.__name__: {
+                "count": count,
+                "rate": (count - self._last_counts.get(event_type, 0)) / interval,
+                "avg_rate": count / uptime,
+            }
+            for event_type, count in counts.items()
+        }
+        self._last_counts = counts
+        self._last_time = now
+        return result
+
+    def handler_summary(self) -> Dict[str, Dict[str, float]]:
+        """按处理器名汇总；同名的处理器（多个实例的绑定方法、lambda、闭包、partial）名字后附对象id区分"""
+        items = list(self.handlers.items())
+        names = [getattr(handler, "__qualname__", repr(handler)) for handler, _ in items]
+        counts = Counter(names)
+        result = {}
+        for name, (handler, histogram) in zip(names, items):
+            if counts[name] > 1:
+                name = f"{name}@{id(getattr(handler, '__self__', handler)):#x}"
+            result[name] = histogram.summary()
+        return result
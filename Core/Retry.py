@@ -0,0 +1,20 @@
+# Core/Retry.py
+import random
+from typing import Iterator, Optional
+
+
+def backoff_delays(retries: Optional[int], base: float = 0.5, cap: float = 30.0, jitter: float = 0.5) -> Iterator[float]:
+    """指数退避等待时间：base*2^n（不超过cap），再随机减去至多jitter比例
+
+    抖动避免多个客户端断线后同时重连；retries为None时无限生成。
+    """
+    attempt = 0
+    while retries is None or attempt < retries:
+        delay = min(cap, base * (1 << attempt))
+        yield delay * (1.0 - jitter * random.random())
+        attempt += 1
+
+
+# ===== 调试代码 =====
+if __name__ == "__main__":
+    print([round(d, 3) for d in backoff_delays(8)])
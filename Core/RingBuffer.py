@@ -0,0 +1,169 @@
+# Core/RingBuffer.py
+import threading
+import time
+from typing import Callable, List, Optional
+
+
+class Sequence:
+    """序号计数器（已处理/已发布的最大序号）"""
+    __slots__ = ("value",)
+
+    def __init__(self, value: int = -1):
+        self.value = value
+
+
+class RingSlot:
+    """默认槽位：事件引用与发布时间（纳秒，仅在需要计时时填写）"""
+    __slots__ = ("event", "ts_ns")
+
+    def __init__(self):
+        self.event = None
+        self.ts_ns = 0
+
+
+def _idle(spins: int):
+    """等待策略：先让出CPU，空转多了再短暂休眠"""
+    if spins < 200:
+        time.sleep(0)
+    else:
+        time.sleep(0.0001)
+
+
+class RingBuffer:
+    """预分配环形缓冲（disruptor风格）
+
+    槽位在构造时一次性分配并反复复用；生产者写槽后推进cursor，消费者各自维护读序号，
+    可批量读取。生产者最多领先最慢的消费者size个槽位，否则等待。
+    单生产者模式下发布不加锁；多个线程发布时需multi_producer=True。
+    """
+
+    def __init__(self, size: int = 65536, factory: Callable = RingSlot, multi_producer: bool = False):
+        if size <= 0 or size & (size - 1):
+            raise ValueError("size必须是2的幂")
+        self.size = size
+        self.mask = size - 1
+        self.slots: List = [factory() for _ in range(size)]
+        self.cursor = Sequence()
+        self._claimed = -1
+        self._gating: List[Sequence] = []
+        self._gating_min = -1
+        self._claim_lock = threading.Lock() if multi_producer else None
+
+    def add_consumer(self) -> "RingConsumer":
+        """新增消费者，从当前cursor之后开始读"""
+        consumer = RingConsumer(self, Sequence(self.cursor.value))
+        self._gating = self._gating + [consumer.sequence]
+        return consumer
+
+    def remove_consumer(self, consumer: "RingConsumer"):
+        self._gating = [s for s in self._gating if s is not consumer.sequence]
+
+    def _claim(self) -> int:
+        seq = self._claimed + 1
+        wrap = seq - self.size
+        if wrap > self._gating_min:
+            spins = 0
+            while self._gating:
+                self._gating_min = min(s.value for s in self._gating)
+                if wrap <= self._gating_min:
+                    break
+                _idle(spins)
+                spins += 1
+        self._claimed = seq
+        return seq
+
+    def _try_claim(self) -> int:
+        """不等待的领取：缓冲已满时返回-1"""
+        seq = self._claimed + 1
+        wrap = seq - self.size
+        if wrap > self._gating_min and self._gating:
+            self._gating_min = min(s.value for s in self._gating)
+            if wrap > self._gating_min:
+                return -1
+        self._claimed = seq
+        return seq
+
+    def try_publish_with(self, translator: Callable, *args) -> bool:
+        """同publish_with，但缓冲已满或锁被占用时不等待，直接返回False（供消费者线程自身发布，避免等自己）"""
+        lock = self._claim_lock
+        if lock is None:
+            seq = self._try_claim()
+            if seq < 0:
+                return False
+            translator(self.slots[seq & self.mask], *args)
+            self.cursor.value = seq
+            return True
+        # 其他生产者可能正持锁等待本消费者推进，这里也不能等锁
+        if not lock.acquire(blocking=False):
+            return False
+        try:
+            seq = self._try_claim()
+            if seq < 0:
+                return False
+            translator(self.slots[seq & self.mask], *args)
+            self.cursor.value = seq
+            return True
+        finally:
+            lock.release()
+
+    def publish(self, value):
+        """把value写入下一个槽位的event字段并发布"""
+        lock = self._claim_lock
+        if lock is None:
+            seq = self._claim()
+            self.slots[seq & self.mask].event = value
+            self.cursor.value = seq
+            return seq
+        with lock:
+            seq = self._claim()
+            self.slots[seq & self.mask].event = value
+            self.cursor.value = seq
+            return seq
+
+    def publish_with(self, translator: Callable, *args):
+        """用translator(slot, *args)原地填写槽位后发布，全程不分配新对象"""
+        lock = self._claim_lock
+        if lock is None:
+            seq = self._claim()
+            translator(self.slots[seq & self.mask], *args)
+            self.cursor.value = seq
+            return seq
+        with lock:
+            seq = self._claim()
+            translator(self.slots[seq & self.mask], *args)
+            self.cursor.value = seq
+            return seq
+
+
+class RingConsumer:
+    """环形缓冲的消费者：自己维护读序号，按批读取"""
+
+    def __init__(self, ring: RingBuffer, sequence: Sequence):
+        self.ring = ring
+        self.sequence = sequence
+
+    def available(self) -> int:
+        return self.ring.cursor.value - self.sequence.value
+
+    def poll(self, handler: Callable, max_batch: int = 1024) -> int:
+        """处理已发布的槽位，返回本批处理数量；槽位在handler返回后即可能被复用"""
+        start = self.sequence.value + 1
+        end = min(self.ring.cursor.value, start + max_batch - 1)
+        if end < start:
+            return 0
+        slots, mask = self.ring.slots, self.ring.mask
+        for seq in range(start, end + 1):
+            handler(slots[seq & mask])
+        self.sequence.value = end
+        return end - start + 1
+
+    def wait_poll(self, handler: Callable, max_batch: int = 1024, timeout: Optional[float] = None) -> int:
+        """阻塞直到有数据或超时"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        spins = 0
+        while True:
+            n = self.poll(handler, max_batch)
+            if n or (deadline is not None and time.monotonic() >= deadline):
+                return n
+            _idle(spins)
+            spins += 1
@@ -0,0 +1,103 @@
+# Model/AsyncMarketData.py
+import asyncio
+from typing import Optional
+
+from Core.AsyncEventBus import AsyncEventBus
+from Core.EventBus import Event
+from Core.Log import get_logger
+from Core.Retry import backoff_delays
+from Model.MarketData3 import MarketDataService, MarketDataEvent
+
+log = get_logger("AsyncMarketData")
+
+
+class LoopBridge:
+    """线程侧的bus替身：MarketDataService在IB读线程上调用publish时，转投到事件循环"""
+
+    def __init__(self, bus: AsyncEventBus, loop: asyncio.AbstractEventLoop):
+        self.bus = bus
+        self.loop = loop
+
+    def publish(self, event: Event):
+        # 队列有上限时满了会丢弃并计入bus.dropped（读线程不能等待事件循环）
+        self.loop.call_soon_threadsafe(self.bus.publish_or_drop, event)
+
+
+class AsyncMarketDataService:
+    """MarketDataService的asyncio适配器
+
+    IB的EClient.run仍需一个读线程；连接、重试、等待就绪都在事件循环内完成，不阻塞其他任务。
+    """
+
+    def __init__(self, bus: AsyncEventBus, host: str = "127.0.0.1", port: int = 7497, client_id: int = 0):
+        self.bus = bus
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.md: Optional[MarketDataService] = None
+
+    async def connect(self, retries: int = 3, retry_delay: float = 0.5, ready_timeout: float = 5.0) -> bool:
+        """连接IB并等待握手完成（nextValidId），失败时按指数退避（带抖动）异步等待后重试"""
+        loop = asyncio.get_running_loop()
+        delays = backoff_delays(retries - 1, base=retry_delay)
+        for attempt in range(1, retries + 1):
+            self.md = MarketDataService(LoopBridge(self.bus, loop))
+            # 运行中断线时由MarketDataService按此地址自动重连并重新订阅
+            self.md._address = (self.host, self.port, self.client_id)
+            # 连接阶段的失败由这里重试，握手完成后才交给MarketDataService自动重连
+            self.md.auto_reconnect = False
+            try:
+                await loop.run_in_executor(None, self.md.connect, self.host, self.port, self.client_id)
+            except Exception as e:
+                log.error("连接失败: %s", e)
+            else:
+                if self.md.isConnected():
+                    self.md._start_reader()
+                    if await self._wait_ready(ready_timeout):
+                        self.md.auto_reconnect = True
+                        log.info("第%d次连接IB成功", attempt)
+                        return True
+            # 放弃本次实例：关闭socket和读线程，并置_stopped，避免它断线后自行重连、与下次尝试争用client_id
+            await loop.run_in_executor(None, self.md.shutdown)
+            delay = next(delays, None)
+            log.warning("第%d次连接失败，%s", attempt, "" if delay is None else f"{delay:.1f}秒后重试...")
+            if delay is not None:
+                await asyncio.sleep(delay)
+        return False
+
+    async def _wait_ready(self, timeout: float) -> bool:
+        """在线程池中等待nextValidId，不占用事件循环"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.md._ready.wait, timeout)
+
+    async def subscribe(self):
+        """发送订阅请求；需先等待合约解析（最多数秒），放到线程池中执行，不阻塞事件循环"""
+        await asyncio.get_running_loop().run_in_executor(None, self.md.subscribe)
+
+    async def disconnect(self):
+        """断开连接，读线程的join放到线程池中执行"""
+        if self.md is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.md.shutdown)
+
+
+# ===== 调试代码 =====
+if __name__ == "__main__":
+    async def main():
+        bus = AsyncEventBus()
+        bus.subscribe(MarketDataEvent, lambda e: print(f"[Debug] {e.symbol} Price: {e.price} ts_ns={e.ts_ns}"))
+        await bus.start()
+
+        service = AsyncMarketDataService(bus)
+        if await service.connect():
+            await service.subscribe()
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await service.disconnect()
+        else:
+            print("连接IB失败")
+        await bus.stop()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
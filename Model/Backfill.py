@@ -0,0 +1,426 @@
+# Model/Backfill.py
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Deque, Dict, Iterable, List, Optional
+
+from ibapi.client import EClient
+from ibapi.wrapper import EWrapper
+
+from Core.Log import get_logger
+from Core.Retry import backoff_delays
+from Model.ContractResolver import ContractResolver, get_resolver
+from Model.MarketData3 import Instrument, TICK_ASK, TICK_BID, TICK_LAST
+from Model.TickStore import TickStore
+
+log = get_logger("Backfill")
+
+_NS = 1_000_000_000
+_DAY = 86400
+# reqHistoricalTicks单次最多返回1000条
+TICKS_PER_REQUEST = 1000
+# 历史数据的reqId从这里开始，避开行情、合约解析和深度行情
+_REQ_ID_BASE = 1 << 26
+
+
+class PacingScheduler:
+    """IB历史数据限速：
+
+    - 任意window秒内最多max_requests个请求（默认10分钟60个）
+    - 同一合约同一数据类型contract_window秒内最多max_per_contract个（默认2秒5个）
+    - 相同请求identical_gap秒内不重复（默认15秒）
+    - 同时在途的请求不超过max_inflight个
+    acquire()在调度线程上阻塞到可以发送为止。
+    """
+
+    def __init__(self, max_requests: int = 60, window: float = 600.0, max_per_contract: int = 5,
+                 contract_window: float = 2.0, identical_gap: float = 15.0, max_inflight: int = 50):
+        self.max_requests = max_requests
+        self.window = window
+        self.max_per_contract = max_per_contract
+        self.contract_window = contract_window
+        self.identical_gap = identical_gap
+        self.max_inflight = max_inflight
+        self._sent: Deque[float] = deque()
+        self._by_contract: Dict[tuple, Deque[float]] = {}
+        self._identical: Dict[tuple, float] = {}
+
+    def delay(self, contract_key: tuple, request_key: tuple, now: float) -> float:
+        """距离可以发送还需等待的秒数"""
+        sent = self._sent
+        while sent and now - sent[0] >= self.window:
+            sent.popleft()
+        wait = 0.0
+        if len(sent) >= self.max_requests:
+            wait = sent[0] + self.window - now
+        recent = self._by_contract.get(contract_key)
+        if recent:
+            while recent and now - recent[0] >= self.contract_window:
+                recent.popleft()
+            if len(recent) >= self.max_per_contract:
+                wait = max(wait, recent[0] + self.contract_window - now)
+        last = self._identical.get(request_key)
+        if last is not None and now - last < self.identical_gap:
+            wait = max(wait, last + self.identical_gap - now)
+        return wait
+
+    def acquire(self, contract_key: tuple, request_key: tuple):
+        while True:
+            now = time.monotonic()
+            wait = self.delay(contract_key, request_key, now)
+            if wait <= 0:
+                break
+            log.debug("历史数据限速，等待%.1f秒", wait)
+            time.sleep(wait)
+        self._sent.append(now)
+        self._by_contract.setdefault(contract_key, deque()).append(now)
+        self._identical[request_key] = now
+
+
+@dataclass
+class BackfillJob:
+    """一个合约一天（UTC）的历史数据；ticks按页向后翻，bars一次请求一天"""
+    instrument: Instrument
+    day: int  # UTC天号（epoch秒 // 86400）
+    what: str = "TRADES"  # TRADES/BID_ASK，或bar_size非空时为reqHistoricalData的whatToShow
+    bar_size: str = ""  # 如"1 min"；为空表示逐笔
+    # 断点：下一页的起始秒、该秒已写入的tick数、已写入的行数
+    next_sec: int = 0
+    skip: int = 0
+    rows: int = 0
+    done: bool = False
+    attempts: int = 0
+    # 当前页的运行状态（不落盘）
+    req_id: int = 0
+    sent_at: float = 0.0
+    page: List = field(default_factory=list)
+
+    @property
+    def id(self) -> str:
+        kind = self.bar_size.replace(" ", "") if self.bar_size else "ticks"
+        return f"{self.instrument.symbol}/{self.what}/{kind}/{self.day}"
+
+    def checkpoint(self) -> dict:
+        return {"next_sec": self.next_sec, "skip": self.skip, "rows": self.rows, "done": self.done}
+
+
+def _ib_time(sec: int) -> str:
+    """IB历史接口的UTC时间格式"""
+    return datetime.fromtimestamp(sec, tz=timezone.utc).strftime("%Y%m%d-%H:%M:%S")
+
+
+class HistoricalBackfill(EWrapper, EClient):
+    """历史数据回补：按天切分任务，在限速调度下并发请求，结果边到边写入本地存储
+
+    逐笔按类型写入独立的TickStore（data/history/TRADES、data/history/BID_ASK，与实时tick分开）：
+    同一合约同一天的TRADES与BID_ASK任务并发执行，共用分区会使行交错、时间不再有序，续传截断也会互相误删；
+    K线写入data/bars/合约/周期/类型_日期.csv（先写.tmp，收完再改名）。
+    每页落盘后更新检查点文件，中断后再次运行会从检查点继续。
+    """
+
+    def __init__(self, history_root: str = "data/history", bar_root: str = "data/bars",
+                 checkpoint_path: str = "data/backfill_checkpoint.json",
+                 scheduler: Optional[PacingScheduler] = None, resolver: Optional[ContractResolver] = None,
+                 request_timeout: float = 60.0, max_attempts: int = 3):
+        EClient.__init__(self, self)
+        self.history_root = history_root
+        # what -> 该类型逐笔的TickStore
+        self._stores: Dict[str, TickStore] = {}
+        self.bar_root = bar_root
+        self.checkpoint_path = checkpoint_path
+        self.scheduler = scheduler or PacingScheduler()
+        self.resolver = resolver or get_resolver()
+        self.request_timeout = request_timeout
+        self.max_attempts = max_attempts
+        self._ready = threading.Event()
+        self._inflight: Dict[int, BackfillJob] = {}
+        # 回调线程 -> 调度线程：(任务, 是否出错)
+        self._completed: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._next_req_id = _REQ_ID_BASE
+        self._checkpoints: Dict[str, dict] = self._load_checkpoints()
+        self.thread = None
+
+    # ---------- 连接 ----------
+    def connect_backfill(self, host="127.0.0.1", port=7497, client_id=2, retries=3, timeout=5.0) -> bool:
+        """连接并等待nextValidId，失败按指数退避（带抖动）重试"""
+        delays = backoff_delays(retries - 1)
+        for attempt in range(1, retries + 1):
+            self._ready.clear()
+            try:
+                self.connect(host, port, clientId=client_id)
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+                if self._ready.wait(timeout):
+                    return True
+                log.warning("等待回补连接握手超时(%.1f秒)", timeout)
+                self.disconnect()
+            except Exception as e:
+                log.error("回补连接失败: %s", e)
+            delay = next(delays, None)
+            if delay is not None:
+                time.sleep(delay)
+        return False
+
+    def nextValidId(self, orderId: int):
+        self._ready.set()
+
+    def contractDetails(self, reqId, contractDetails):
+        self.resolver.on_details(reqId, contractDetails)
+
+    def contractDetailsEnd(self, reqId):
+        self.resolver.on_end(reqId)
+
+    def error(self, reqId, errorCode, errorString, advancedOrderRejectJson=None):
+        if self.resolver.on_error(reqId):
+            return
+        job = self._inflight.pop(reqId, None)
+        if job is None:
+            log.warning("回补错误: reqId=%s, code=%s, msg=%s", reqId, errorCode, errorString)
+            return
+        if errorCode == 162 and "no data" in errorString.lower():
+            # 该时段没有数据（如休市日），任务直接完成
+            job.page = []
+            job.done = True
+            self._completed.put((job, False))
+            return
+        log.warning("回补请求失败 %s: code=%s, msg=%s", job.id, errorCode, errorString)
+        self._completed.put((job, True))
+
+    # ---------- 任务 ----------
+    def jobs(self, instruments: Iterable, start: datetime, end: datetime,
+             what: str = "TRADES", bar_size: str = "") -> List[BackfillJob]:
+        """按UTC日切分[start, end)；已在检查点中完成的任务会被跳过"""
+        first = int(start.timestamp()) // _DAY
+        last = -(-int(end.timestamp()) // _DAY)
+        result = []
+        for spec in instruments:
+            instrument = Instrument.parse(spec)
+            for day in range(first, last):
+                job = BackfillJob(instrument, day, what, bar_size)
+                saved = self._checkpoints.get(job.id)
+                if saved is not None:
+                    job.next_sec, job.skip, job.rows, job.done = (
+                        saved["next_sec"], saved["skip"], saved["rows"], saved["done"])
+                if not job.next_sec:
+                    job.next_sec = day * _DAY
+                if not job.done:
+                    result.append(job)
+        return result
+
+    def run_jobs(self, jobs: List[BackfillJob]):
+        """调度线程：在限速允许时发出请求，处理完成的页并续发下一页，直到全部完成"""
+        self.resolver.resolve(self, {job.instrument.symbol: job.instrument for job in jobs}.values())
+        for job in jobs:
+            if not job.bar_size:
+                # 丢弃上次中断时检查点之后写入的行，避免重复
+                self.store(job.what).truncate(job.instrument.symbol, job.day * _DAY * _NS, job.rows)
+        pending: Deque[BackfillJob] = deque(jobs)
+        total = len(jobs)
+        finished = 0
+        # 在途数在调度线程上计数：回调先出_inflight、后入完成队列，不能以_inflight为空判断结束
+        outstanding = 0
+        while pending or outstanding:
+            if pending and outstanding < self.scheduler.max_inflight:
+                self._send(pending.popleft())
+                outstanding += 1
+                block = False
+            else:
+                block = True
+            for job, failed in self._drain(block):
+                outstanding -= 1
+                if failed:
+                    job.attempts += 1
+                    if job.attempts >= self.max_attempts:
+                        log.error("回补放弃 %s（%d次失败）", job.id, job.attempts)
+                        finished += 1
+                        continue
+                    pending.append(job)
+                    continue
+                job.attempts = 0
+                self._commit(job)
+                if job.done:
+                    finished += 1
+                    log.info("回补完成 %s，%d行（%d/%d）", job.id, job.rows, finished, total)
+                else:
+                    pending.append(job)
+            self._expire()
+        for store in self._stores.values():
+            store.sync()
+
+    def store(self, what: str) -> TickStore:
+        """某类型逐笔的存储（按需创建，只在调度线程上调用）"""
+        store = self._stores.get(what)
+        if store is None:
+            store = self._stores[what] = TickStore(None, root=os.path.join(self.history_root, what))
+        return store
+
+    def close(self):
+        """写完并关闭全部逐笔存储"""
+        for store in self._stores.values():
+            store.close()
+
+    def _drain(self, block: bool):
+        items = []
+        try:
+            items.append(self._completed.get(timeout=1.0) if block else self._completed.get_nowait())
+            while True:
+                items.append(self._completed.get_nowait())
+        except queue.Empty:
+            pass
+        return items
+
+    def _expire(self):
+        """超时未返回的请求按失败处理"""
+        now = time.monotonic()
+        for req_id, job in list(self._inflight.items()):
+            if now - job.sent_at > self.request_timeout:
+                if self._inflight.pop(req_id, None) is not None:
+                    log.warning("回补请求超时 %s", job.id)
+                    self._completed.put((job, True))
+
+    def _send(self, job: BackfillJob):
+        instrument = job.instrument
+        contract = self.resolver.contract(instrument)
+        kind = job.bar_size or "ticks"
+        self.scheduler.acquire((instrument.symbol, job.what),
+                               (instrument.symbol, job.what, kind, job.next_sec))
+        req_id = self._next_req_id
+        self._next_req_id += 1
+        job.req_id = req_id
+        job.sent_at = time.monotonic()
+        job.page = []
+        self._inflight[req_id] = job
+        if job.bar_size:
+            # 一天的K线一次请求取完，重试时从头写
+            os.makedirs(self._bar_dir(job), exist_ok=True)
+            if os.path.exists(self._bar_file(job) + ".tmp"):
+                os.remove(self._bar_file(job) + ".tmp")
+            job.rows = 0
+            end_sec = (job.day + 1) * _DAY
+            self.reqHistoricalData(req_id, contract, _ib_time(end_sec), "1 D", job.bar_size,
+                                   job.what, 0, 2, False, [])
+        else:
+            self.reqHistoricalTicks(req_id, contract, _ib_time(job.next_sec), "", TICKS_PER_REQUEST,
+                                    job.what, 0, True, [])
+        log.debug("回补请求 %s reqId=%s from=%s", job.id, req_id, _ib_time(job.next_sec))
+
+    # ---------- 回调（IB读线程） ----------
+    def historicalTicksLast(self, reqId, ticks, done):
+        self._on_ticks(reqId, [(t.time, t.price, TICK_LAST) for t in ticks])
+
+    def historicalTicksBidAsk(self, reqId, ticks, done):
+        self._on_ticks(reqId, [(t.time, (t.priceBid, t.priceAsk), None) for t in ticks])
+
+    def _on_ticks(self, reqId: int, ticks: list):
+        job = self._inflight.pop(reqId, None)
+        if job is None:
+            return
+        end_sec = (job.day + 1) * _DAY
+        # 跳过上一页已写入的同一秒tick，并截掉超出当天的部分
+        skip = job.skip if ticks and ticks[0][0] == job.next_sec else 0
+        page = [t for t in ticks[skip:] if t[0] < end_sec]
+        symbol = job.instrument.symbol
+        append = self._stores[job.what].append
+        for sec, price, tick_type in page:
+            ts_ns = sec * _NS
+            if tick_type is None:
+                bid, ask = price
+                append(symbol, ts_ns, bid, TICK_BID)
+                append(symbol, ts_ns, ask, TICK_ASK)
+            else:
+                append(symbol, ts_ns, price, tick_type)
+        job.rows += len(page) * (2 if job.what == "BID_ASK" else 1)
+        if page:
+            last = page[-1][0]
+            same = sum(1 for t in page if t[0] == last)
+            job.skip = same + (job.skip if last == job.next_sec else 0)
+            job.next_sec = last
+        elif len(ticks) >= TICKS_PER_REQUEST:
+            # 同一秒内超过一页的tick无法再翻页，跳到下一秒
+            log.warning("回补 %s 在%s内超过%d条，跳过该秒剩余部分", job.id, _ib_time(job.next_sec), TICKS_PER_REQUEST)
+            job.next_sec += 1
+            job.skip = 0
+        # 不满一页或已越过当天，说明当天取完了
+        job.done = len(ticks) < TICKS_PER_REQUEST or (ticks and ticks[-1][0] >= end_sec)
+        self._completed.put((job, False))
+
+    def historicalData(self, reqId, bar):
+        job = self._inflight.get(reqId)
+        if job is None:
+            return
+        job.page.append(f"{bar.date},{bar.open},{bar.high},{bar.low},{bar.close},{bar.volume}\n")
+        # 每满一批就写入临时文件，不在内存里积攒整天的K线
+        if len(job.page) >= 500:
+            self._write_bars(job)
+
+    def historicalDataEnd(self, reqId, start, end):
+        job = self._inflight.pop(reqId, None)
+        if job is None:
+            return
+        self._write_bars(job)
+        tmp = self._bar_file(job) + ".tmp"
+        if os.path.exists(tmp):
+            os.replace(tmp, self._bar_file(job))
+        job.done = True
+        self._completed.put((job, False))
+
+    def _write_bars(self, job: BackfillJob):
+        with open(self._bar_file(job) + ".tmp", "a", encoding="utf-8") as f:
+            f.writelines(job.page)
+        job.rows += len(job.page)
+        job.page = []
+
+    def _bar_dir(self, job: BackfillJob) -> str:
+        return os.path.join(self.bar_root, job.instrument.symbol, job.bar_size.replace(" ", ""))
+
+    def _bar_file(self, job: BackfillJob) -> str:
+        day = datetime.fromtimestamp(job.day * _DAY, tz=timezone.utc).strftime("%Y%m%d")
+        return os.path.join(self._bar_dir(job), f"{job.what}_{day}.csv")
+
+    # ---------- 检查点 ----------
+    def _commit(self, job: BackfillJob):
+        """本页数据落盘后再记录检查点"""
+        if not job.bar_size:
+            self.store(job.what).sync()
+        self._checkpoints[job.id] = job.checkpoint()
+        self._save_checkpoints()
+
+    def _load_checkpoints(self) -> Dict[str, dict]:
+        if not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_checkpoints(self):
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._checkpoints, f)
+        os.replace(tmp, self.checkpoint_path)
+
+
+# ===== 调试代码 =====
+if __name__ == "__main__":
+    from datetime import timedelta
+
+    backfill = HistoricalBackfill()
+    if backfill.connect_backfill():
+        end = datetime.now(timezone.utc)
+        jobs = backfill.jobs(["GCJ5", "GCM5"], end - timedelta(days=3), end)
+        jobs += backfill.jobs(["GCJ5", "GCM5"], end - timedelta(days=30), end, bar_size="1 min")
+        print(f"[Debug] 待回补任务{len(jobs)}个")
+        try:
+            backfill.run_jobs(jobs)
+        except KeyboardInterrupt:
+            print("[Debug] 已中断，下次运行从检查点继续")
+        backfill.close()
+        backfill.disconnect()
+    else:
+        print("连接IB失败")
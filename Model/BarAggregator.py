@@ -0,0 +1,200 @@
+# Model/BarAggregator.py
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from Core.EventBus import Event, EventBus, fast_constructor
+from Core.Log import get_logger
+from Model.MarketData import MarketDataEvent
+from Model.MarketData3 import TRADE_TICK_TYPES
+from Model.SpreadCalculator import SpreadEvent
+
+log = get_logger("BarAggregator")
+
+_NS = 1_000_000_000
+DEFAULT_INTERVALS = (1, 5, 60, 300)  # 秒：1s/5s/1m/5m
+
+
+@dataclass(frozen=True, slots=True)
+class BarEvent(Event):
+    """K线收盘事件；价差K线的symbol为价差结构名（SpreadEvent.name，如"leg1-leg2"）"""
+    symbol: str
+    interval: int  # 周期（秒）
+    open: float
+    high: float
+    low: float
+    close: float
+    ticks: int  # 本周期内的tick数
+    start_ns: int  # 周期起点（epoch纳秒，含）
+    end_ns: int  # 周期终点（不含）
+
+
+BarEvent.make = staticmethod(fast_constructor(BarEvent))
+
+
+class _Bars:
+    """单个品种所有周期的当前K线，按周期下标存放在平行数组里"""
+    __slots__ = ("symbol", "widths", "intervals", "start", "closed", "open", "high", "low", "close", "ticks",
+                 "last_ts", "wall_ns", "late", "lock")
+
+    def __init__(self, symbol: str, intervals: Sequence[int]):
+        k = len(intervals)
+        self.symbol = symbol
+        self.intervals = tuple(intervals)
+        self.widths = tuple(i * _NS for i in intervals)
+        self.start = [-1] * k
+        # 各周期最近一根已收盘K线的起点，不再重开
+        self.closed = [-1] * k
+        self.open = [0.0] * k
+        self.high = [0.0] * k
+        self.low = [0.0] * k
+        self.close = [0.0] * k
+        self.ticks = [0] * k
+        # 最新tick的交易所时间及收到它时的墙钟时间，定时收盘据此估算当前交易所时间
+        self.last_ts = 0
+        self.wall_ns = 0
+        # 落在已收盘K线内、被丢弃的迟到tick数（按周期累计）
+        self.late = 0
+        self.lock = threading.Lock()
+
+    def update(self, price: float, ts_ns: int, wall_ns: int, closed: List[BarEvent]):
+        """每个周期O(1)：跨过周期边界时收盘旧K线（追加到closed），否则原地更新高低收"""
+        if ts_ns >= self.last_ts:
+            self.last_ts = ts_ns
+            self.wall_ns = wall_ns
+        start, high, low, close, ticks = self.start, self.high, self.low, self.close, self.ticks
+        for i, width in enumerate(self.widths):
+            bar_start = ts_ns - ts_ns % width
+            if bar_start <= self.closed[i]:
+                # 所属K线已发布过，不重开（否则同一起点会发出第二根K线）
+                self.late += 1
+                continue
+            if bar_start > start[i]:
+                if ticks[i]:
+                    closed.append(self._bar(i))
+                    self.closed[i] = start[i]
+                start[i] = bar_start
+                self.open[i] = high[i] = low[i] = close[i] = price
+                ticks[i] = 1
+            else:
+                # 乱序到达的旧tick并入当前K线，不重开已收盘的K线
+                if price > high[i]:
+                    high[i] = price
+                elif price < low[i]:
+                    low[i] = price
+                close[i] = price
+                ticks[i] += 1
+
+    def flush(self, now_ns: int, closed: List[BarEvent]):
+        """收盘已过终点但还没等到下一个tick的K线（now_ns为交易所时间）"""
+        for i, width in enumerate(self.widths):
+            if self.ticks[i] and self.start[i] + width <= now_ns:
+                closed.append(self._bar(i))
+                self.closed[i] = self.start[i]
+                self.ticks[i] = 0
+
+    def _bar(self, i: int) -> BarEvent:
+        return BarEvent.make(self.symbol, self.intervals[i], self.open[i], self.high[i], self.low[i],
+                             self.close[i], self.ticks[i], self.start[i], self.start[i] + self.widths[i])
+
+
+class BarAggregator:
+    """多周期K线合成：一次遍历同时维护所有周期，K线收盘时发布BarEvent
+
+    下游（策略、GUI）订阅BarEvent即可，不必处理每一个tick。
+    行情内联订阅（在发布线程上、早于总线的合并），积压时也不会漏掉高低点和tick数；
+    K线按交易所时间分桶；后台线程每flush_interval秒收盘到期的K线，行情清淡时也能按时收盘（None时不启动，由调用方flush）。
+    到期判断用各品种最新tick的交易所时间加上此后经过的墙钟时间，延迟行情（交易所时间落后墙钟数分钟）也不会提前收盘；
+    另留close_delay秒等待稍晚到达的tick。已收盘的K线不再重开，之后落入其中的tick丢弃并计入late_ticks()。
+    """
+
+    def __init__(self, bus: EventBus, intervals: Sequence[int] = DEFAULT_INTERVALS,
+                 symbols: Optional[Sequence[str]] = None, spreads: bool = True,
+                 flush_interval: Optional[float] = 1.0, close_delay: float = 1.0):
+        self.bus = bus
+        self.intervals = tuple(sorted(intervals))
+        self._close_delay_ns = int(close_delay * _NS)
+        # None表示所有合约
+        self.symbols = set(symbols) if symbols is not None else None
+        self._bars: Dict[str, _Bars] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        bus.subscribe(MarketDataEvent, self.on_market_data, inline=True)
+        if spreads:
+            bus.subscribe(SpreadEvent, self.on_spread)
+        if flush_interval:
+            self._thread = threading.Thread(target=self._run, args=(flush_interval,), name="bar-flush", daemon=True)
+            self._thread.start()
+
+    def on_market_data(self, event: MarketDataEvent):
+        # 合约K线只用成交价
+        if event.tickType not in TRADE_TICK_TYPES:
+            return
+        if self.symbols is not None and event.symbol not in self.symbols:
+            return
+        self._update(event.symbol, event.price, event.ts_ns)
+
+    def on_spread(self, event: SpreadEvent):
+        self._update(event.name, event.spread, event.ts_ns)
+
+    def _update(self, symbol: str, price: float, ts_ns: int):
+        bars = self._bars.get(symbol)
+        if bars is None:
+            with self._lock:
+                bars = self._bars.setdefault(symbol, _Bars(symbol, self.intervals))
+        closed: List[BarEvent] = []
+        with bars.lock:
+            bars.update(price, ts_ns, time.time_ns(), closed)
+        for bar in closed:
+            self.bus.publish(bar)
+
+    def flush(self, now_ns: Optional[int] = None):
+        """收盘所有到期K线（由后台线程定时调用，也可手动调用）
+
+        now_ns为交易所时间；None时按各品种最新tick的交易所时间加上此后经过的墙钟时间、再减close_delay估算。
+        """
+        wall_ns = time.time_ns()
+        closed: List[BarEvent] = []
+        for bars in list(self._bars.values()):
+            with bars.lock:
+                if now_ns is not None:
+                    bars.flush(now_ns, closed)
+                elif bars.wall_ns:
+                    bars.flush(bars.last_ts + wall_ns - bars.wall_ns - self._close_delay_ns, closed)
+        for bar in closed:
+            self.bus.publish(bar)
+
+    def late_ticks(self) -> int:
+        """落在已收盘K线内而被丢弃的tick数（按周期累计）"""
+        return sum(bars.late for bars in list(self._bars.values()))
+
+    def _run(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                log.exception("K线定时收盘失败")
+
+    def close(self):
+        """停止定时收盘线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+# ===== 调试代码 =====
+if __name__ == "__main__":
+    bus = EventBus()
+    bus.subscribe(BarEvent, lambda e: print(f"[Debug] {e.symbol} {e.interval}s "
+                                            f"O={e.open} H={e.high} L={e.low} C={e.close} n={e.ticks}"))
+    aggregator = BarAggregator(bus, intervals=(1, 5), flush_interval=None)
+    bus.start()
+
+    t0 = (time.time_ns() // (5 * _NS)) * 5 * _NS
+    for k in range(120):
+        bus.publish(MarketDataEvent("GCJ5", 2000.0 + (k % 7) * 0.1, t0 + k * _NS // 10, 88))
+    aggregator.flush(t0 + 20 * _NS)
+    time.sleep(0.5)
+    bus.stop()
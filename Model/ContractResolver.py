@@ -0,0 +1,220 @@
+# Model/ContractResolver.py
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional
+
+from ibapi.contract import Contract
+from Core.Log import get_logger
+
+log = get_logger("ContractResolver")
+
+# contractDetails的reqId从这里开始，避开行情/订单使用的小号reqId
+_REQ_ID_BASE = 1 << 24
+DEFAULT_CACHE_PATH = "contract_cache.json"
+DEFAULT_TTL = 24 * 3600.0
+
+
+@dataclass
+class ContractInfo:
+    """reqContractDetails解析结果，按本地代码缓存"""
+    symbol: str  # localSymbol
+    con_id: int
+    root: str
+    sec_type: str
+    exchange: str
+    currency: str
+    multiplier: float
+    min_tick: float
+    expiry: str  # lastTradeDateOrContractMonth
+    trading_class: str = ""
+    fetched_at: float = 0.0  # epoch秒，用于TTL判断
+
+    @classmethod
+    def from_details(cls, details) -> "ContractInfo":
+        c = details.contract
+        return cls(
+            symbol=c.localSymbol,
+            con_id=c.conId,
+            root=c.symbol,
+            sec_type=c.secType,
+            exchange=c.exchange,
+            currency=c.currency,
+            multiplier=float(c.multiplier or 1),
+            min_tick=float(details.minTick or 0.0),
+            expiry=c.lastTradeDateOrContractMonth,
+            trading_class=getattr(c, "tradingClass", ""),
+            fetched_at=time.time(),
+        )
+
+    def to_contract(self) -> Contract:
+        """带conId的合约：IB不再需要按symbol/localSymbol消歧"""
+        contract = Contract()
+        contract.conId = self.con_id
+        contract.symbol = self.root
+        contract.localSymbol = self.symbol
+        contract.secType = self.sec_type
+        contract.exchange = self.exchange
+        contract.currency = self.currency
+        return contract
+
+
+class _Pending:
+    __slots__ = ("symbol", "results", "done")
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.results: List[ContractInfo] = []
+        self.done = threading.Event()
+
+
+class ContractResolver:
+    """合约解析器：每个本地代码只调用一次reqContractDetails，结果缓存在内存和磁盘（带TTL）
+
+    行情和下单共用同一个解析器；拥有IB连接的服务把contractDetails/contractDetailsEnd回调转给它。
+    未缓存的合约一次性并发请求，启动时只等待一个往返而不是每个合约一个。
+    """
+
+    def __init__(self, cache_path: Optional[str] = DEFAULT_CACHE_PATH, ttl: float = DEFAULT_TTL):
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cache: Dict[str, ContractInfo] = {}
+        self._pending: Dict[int, _Pending] = {}
+        self._next_req_id = _REQ_ID_BASE
+        self._load()
+
+    # ---------- 查询 ----------
+    def get(self, symbol: str) -> Optional[ContractInfo]:
+        """未过期的缓存结果，没有则返回None"""
+        info = self._cache.get(symbol)
+        if info is None or time.time() - info.fetched_at > self.ttl:
+            return None
+        return info
+
+    def contract(self, instrument) -> Contract:
+        """instrument需有symbol/root/sec_type/exchange/currency；已解析时返回带conId的合约"""
+        info = self.get(instrument.symbol)
+        if info is not None:
+            return info.to_contract()
+        contract = Contract()
+        contract.symbol = instrument.root
+        contract.localSymbol = instrument.symbol
+        contract.secType = instrument.sec_type
+        contract.exchange = instrument.exchange
+        contract.currency = instrument.currency
+        return contract
+
+    # ---------- 解析 ----------
+    def resolve(self, client, instruments: Iterable, timeout: float = 5.0) -> Dict[str, ContractInfo]:
+        """为未缓存的合约并发发送reqContractDetails并等待结果（不能在IB读线程上调用）"""
+        waiting = []
+        with self._lock:
+            for instrument in instruments:
+                if self.get(instrument.symbol) is not None:
+                    continue
+                req_id = self._next_req_id
+                self._next_req_id += 1
+                pending = _Pending(instrument.symbol)
+                self._pending[req_id] = pending
+                waiting.append((req_id, instrument, pending))
+        for req_id, instrument, _ in waiting:
+            client.reqContractDetails(req_id, self.contract(instrument))
+        deadline = time.monotonic() + timeout
+        for req_id, instrument, pending in waiting:
+            if not pending.done.wait(max(0.0, deadline - time.monotonic())):
+                log.warning("合约解析超时: %s", instrument.symbol)
+                with self._lock:
+                    self._pending.pop(req_id, None)
+        if waiting:
+            self._save()
+        return {symbol: info for symbol, info in self._cache.items()}
+
+    def on_details(self, reqId: int, details) -> bool:
+        """contractDetails回调转发入口；不是本解析器的reqId时返回False"""
+        pending = self._pending.get(reqId)
+        if pending is None:
+            return False
+        pending.results.append(ContractInfo.from_details(details))
+        return True
+
+    def on_end(self, reqId: int) -> bool:
+        """contractDetailsEnd回调转发入口"""
+        with self._lock:
+            pending = self._pending.pop(reqId, None)
+            if pending is None:
+                return False
+            results = pending.results
+            match = [info for info in results if info.symbol == pending.symbol]
+            if not results:
+                log.warning("未找到合约: %s", pending.symbol)
+            else:
+                if len(results) > 1:
+                    log.warning("合约%s返回%d个结果，取本地代码匹配的一个", pending.symbol, len(results))
+                info = (match or results)[0]
+                self._cache[pending.symbol] = info
+                log.info("合约解析 %s conId=%s multiplier=%g minTick=%g expiry=%s",
+                         pending.symbol, info.con_id, info.multiplier, info.min_tick, info.expiry)
+        pending.done.set()
+        return True
+
+    def on_error(self, reqId: int) -> bool:
+        """reqContractDetails报错（如200：找不到合约）时结束等待"""
+        with self._lock:
+            pending = self._pending.pop(reqId, None)
+        if pending is None:
+            return False
+        log.warning("合约解析失败: %s", pending.symbol)
+        pending.done.set()
+        return True
+
+    # ---------- 磁盘缓存 ----------
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                raw = json.load(f)
+            now = time.time()
+            for item in raw:
+                info = ContractInfo(**item)
+                if now - info.fetched_at <= self.ttl:
+                    self._cache[info.symbol] = info
+            log.debug("从%s加载%d个合约", self.cache_path, len(self._cache))
+        except (OSError, ValueError, TypeError) as e:
+            log.warning("合约缓存读取失败，忽略: %s", e)
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        with self._lock:
+            raw = [asdict(info) for info in self._cache.values()]
+        tmp = self.cache_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(raw, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            log.warning("合约缓存写入失败: %s", e)
+
+
+_default: Optional[ContractResolver] = None
+_default_lock = threading.Lock()
+
+
+def get_resolver() -> ContractResolver:
+    """进程内共享的解析器（行情与下单共用同一份缓存）"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ContractResolver()
+        return _default
+
+
+# ===== 调试代码 =====
+if __name__ == "__main__":
+    resolver = get_resolver()
+    for symbol, info in resolver._cache.items():
+        print(f"[Debug] {symbol}: {info}")
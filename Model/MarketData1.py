@@ -3,10 +3,13 @@ from ibapi.client import EClient
 from ibapi.wrapper import EWrapper
 from ibapi.contract import Contract
 from Core.EventBus import Event, EventBus
+from Core.Log import get_logger
 from dataclasses import dataclass
 import threading
 import time
 
+log = get_logger("MarketData1")
+
 # 这个就只管接受两个数据，不管时间戳（时间戳是 fake 的，用 ？ 代替）
 @dataclass
 class MarketDataEvent(Event):
@@ -39,13 +42,13 @@ class MarketDataService(EWrapper, EClient):
             time.sleep(1)  # 等待连接建立
             return True
         except Exception as e:
-            print(f"连接失败: {e}")
+            log.error("连接失败: %s", e)
             return False
 
     def error(self, reqId, errorCode, errorString, advancedOrderRejectJson=None):
         if errorCode == 504 and not self._connected:
             return  # 静默处理断开后的504错误
-        print(f"行情错误: reqId={reqId}, code={errorCode}, msg={errorString}")
+        log.warning("行情错误: reqId=%s, code=%s, msg=%s", reqId, errorCode, errorString)
 
     def connectAck(self):
         self._connected = True
@@ -56,7 +59,7 @@ class MarketDataService(EWrapper, EClient):
     def subscribe(self):
         """订阅两个相同合约"""
         if not self._connected:
-            print("未连接IB")
+            log.warning("未连接IB")
             return
 
         # 创建相同合约（示例用GC期货）
@@ -67,11 +70,11 @@ class MarketDataService(EWrapper, EClient):
         self.reqMarketDataType(3)
         self.reqMktData(1, contract1, "", False, False, [])
         self.reqMktData(2, contract2, "", False, False, [])
-        print("已发送订阅请求")
+        log.info("已发送订阅请求")
 
     def _create_contract(self,localSymbol):
         """创建合约（与调试示例相同）"""
-        print(localSymbol)
+        log.debug("创建合约 %s", localSymbol)
         contract = Contract()
         contract.symbol = "GC"
         contract.localSymbol = localSymbol  # 请根据实际合约修改
@@ -87,7 +90,7 @@ class MarketDataService(EWrapper, EClient):
             try:
                 timestamp = int(value)
                 self.timestamps[reqId] = timestamp
-                print(f"[Debug] 更新时间戳 reqId={reqId}, timestamp={timestamp}")
+                log.debug("更新时间戳 reqId=%s, timestamp=%s", reqId, timestamp)
             except ValueError:
                 pass
 
@@ -3,11 +3,15 @@ from ibapi.client import EClient
 from ibapi.wrapper import EWrapper
 from ibapi.contract import Contract
 from Core.EventBus import Event, EventBus
+from Core.Log import get_logger
 from dataclasses import dataclass
+import logging
 import threading
 from datetime import datetime, timezone
 import time
 
+log = get_logger("MarketData2")
+
 # 这个管时间戳，但没有双重缓存，时间未必同步的
 @dataclass
 class MarketDataEvent(Event):
@@ -40,13 +44,13 @@ class MarketDataService(EWrapper, EClient):
             time.sleep(1)  # 等待连接建立
             return True
         except Exception as e:
-            print(f"连接失败: {e}")
+            log.error("连接失败: %s", e)
             return False
 
     def error(self, reqId, errorCode, errorString, advancedOrderRejectJson=None):
         if errorCode == 504 and not self._connected:
             return  # 静默处理断开后的504错误
-        print(f"行情错误: reqId={reqId}, code={errorCode}, msg={errorString}")
+        log.warning("行情错误: reqId=%s, code=%s, msg=%s", reqId, errorCode, errorString)
 
     def connectAck(self):
         self._connected = True
@@ -56,12 +60,12 @@ class MarketDataService(EWrapper, EClient):
 
     def reqMarketDataType(self, dataType):
         super().reqMarketDataType(dataType)
-        print(f"[Debug] 请求市场数据类型: {dataType}")  # 新增
+        log.debug("请求市场数据类型: %s", dataType)  # 新增
 
     def subscribe(self):
         """订阅两个相同合约"""
         if not self._connected:
-            print("未连接IB")
+            log.warning("未连接IB")
             return
 
         # 创建相同合约（示例用GC期货）
@@ -72,11 +76,11 @@ class MarketDataService(EWrapper, EClient):
         self.reqMarketDataType(3)
         self.reqMktData(1, contract1, "", False, False, [])
         self.reqMktData(2, contract2, "", False, False, [])
-        print("已发送订阅请求")
+        log.info("已发送订阅请求")
 
     def _create_contract(self,localSymbol):
         """创建合约（与调试示例相同）"""
-        print(localSymbol)
+        log.debug("创建合约 %s", localSymbol)
         contract = Contract()
         contract.symbol = "GC"
         contract.localSymbol = localSymbol  # 请根据实际合约修改
@@ -87,11 +91,10 @@ class MarketDataService(EWrapper, EClient):
 
     def nextValidId(self, orderId):
         super().nextValidId(orderId)
-        print(f"[Debug] 下一个有效ID: {orderId}")  # 新增
+        log.debug("下一个有效ID: %s", orderId)  # 新增
 
     def format_timestamp(self,timestamp_ms):
         dt_utc =datetime.fromtimestamp(int(timestamp_ms) , tz=timezone.utc)
-        print(f"时间={dt_utc.strftime("%Y-%m-%d %H:%M:%S.%f")}")
         return dt_utc.strftime("%Y-%m-%d %H:%M:%S.%f")
 
 
@@ -99,13 +102,14 @@ class MarketDataService(EWrapper, EClient):
         """处理时间戳行情"""
         super().tickString(reqId, tickType, value)
         #print(f"[看看收到什么了] tickString: reqId={reqId}, type={tickType}, value={value}")  # 新增
-        tmpd=self.format_timestamp(value)
-        print(f"{tmpd}")
+        # 每个时间戳都会进来：级别未开启时连格式化也省掉
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("时间=%s", self.format_timestamp(value))
         if tickType == 45 or 88:  # LAST_TIMESTAMP
             try:
                 timestamp = int(value)
                 self.timestamps[reqId] = timestamp
-                print(f"[Debug] 更新时间戳 reqId={reqId}, timestamp={timestamp}")
+                log.debug("更新时间戳 reqId=%s, timestamp=%s", reqId, timestamp)
             except ValueError:
                 pass
 
@@ -2,18 +2,24 @@
 # Core/__init__.py
 from ibapi.client import EClient
 from ibapi.wrapper import EWrapper
-from ibapi.contract import Contract
-from Core.EventBus import Event, EventBus
+from Core.EventBus import Event, EventBus, fast_constructor
+from Core.Log import get_logger
+from Core.Retry import backoff_delays
+from Model.ContractResolver import ContractResolver, get_resolver
 from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+import json
 import threading
 from datetime import datetime, timezone
 import time
 from collections import deque  # 新增导入
 
+log = get_logger("MarketData3")
+
 # 新增deque双端队列用于缓存价格和时间戳数据
 # 在tickString中仅处理tickType=88的延时时间戳
-# 使用cache_lock保证线程安全
-# 通过本地时间差（1秒窗口）匹配价格和时间戳
+# 每个合约一个配对器（独立锁），按本地接收时间窗口匹配，丢弃计数可通过matcher_stats查看
+# 通过本地时间差（match_window秒窗口）匹配价格和时间戳
 # 发布事件时使用服务器原始时间戳
 
 
@@ -22,149 +28,546 @@ from collections import deque  # 新增导入
 
 #缓存原始数据：临时存储价格和时间戳。
 #时间对齐匹配：确保发布的事件中价格和时间戳来自同一时刻的行情。
-@dataclass
+@dataclass(frozen=True, slots=True)
 class MarketDataEvent(Event):
     symbol: str
     price: float
-    time: str  # 使用服务器时间戳
+    ts_ns: int  # 服务器时间戳（epoch纳秒）
     tickType: int
 
 
+# 热路径快速构造：MarketDataEvent.make(symbol, price, ts_ns, tickType)
+MarketDataEvent.make = staticmethod(fast_constructor(MarketDataEvent))
+
+# IB TickType编号（与ibapi.ticktype.TickTypeEnum一致）
+TICK_BID = 1
+TICK_ASK = 2
+TICK_LAST = 4
+# 成交价事件的tickType：逐笔成交为TICK_LAST，普通行情配对后为88（带服务器时间）
+# 逐笔买卖一价也以TICK_BID/TICK_ASK发布MarketDataEvent，按成交价计算的消费者需过滤
+TRADE_TICK_TYPES = frozenset((TICK_LAST, 88))
+
+
+@dataclass(frozen=True, slots=True)
+class QuoteEvent(Event):
+    """一档行情快照；seq每次盘口变化加一，消费端可据此判断是否错过更新"""
+    symbol: str
+    bid: float
+    ask: float
+    last: float
+    bid_size: float
+    ask_size: float
+    last_size: float
+    seq: int
+    ts_ns: int  # 本地接收时间（epoch纳秒）
+
+    @property
+    def mid(self) -> float:
+        """买卖中间价，任一侧缺失时为0"""
+        return (self.bid + self.ask) * 0.5 if self.bid > 0 and self.ask > 0 else 0.0
+
+
+QuoteEvent.make = staticmethod(fast_constructor(QuoteEvent))
+
+# TopOfBook.values下标
+BOOK_BID, BOOK_ASK, BOOK_LAST, BOOK_BID_SIZE, BOOK_ASK_SIZE, BOOK_LAST_SIZE = range(6)
+# tickPrice/tickSize的TickType（实时与延时） -> values下标
+_PRICE_INDEX = {1: BOOK_BID, 66: BOOK_BID, 2: BOOK_ASK, 67: BOOK_ASK, 4: BOOK_LAST, 68: BOOK_LAST}
+_SIZE_INDEX = {0: BOOK_BID_SIZE, 69: BOOK_BID_SIZE, 3: BOOK_ASK_SIZE, 70: BOOK_ASK_SIZE,
+               5: BOOK_LAST_SIZE, 71: BOOK_LAST_SIZE}
+
+
+class TopOfBook:
+    """单个合约的一档盘口，在IB读线程上原地更新"""
+    __slots__ = ("symbol", "values", "seq", "ts_ns")
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.values = [0.0] * 6
+        self.seq = 0
+        self.ts_ns = 0
+
+    def update(self, index: int, value: float, ts_ns: int) -> bool:
+        """值有变化时更新并递增seq，返回是否变化"""
+        values = self.values
+        if values[index] == value:
+            return False
+        values[index] = value
+        self.seq += 1
+        self.ts_ns = ts_ns
+        return True
+
+    def snapshot(self) -> QuoteEvent:
+        return QuoteEvent.make(self.symbol, *self.values, self.seq, self.ts_ns)
+
+# 行情订阅方式
+FEED_MKTDATA = "mktdata"   # reqMktData：价格与时间戳分开到达，需在本地匹配
+FEED_LAST = "last"         # reqTickByTickData("Last")：成交价与交易所时间一起到达
+FEED_ALL_LAST = "alllast"  # reqTickByTickData("AllLast")：含组合/场外成交
+FEED_BIDASK = "bidask"     # reqTickByTickData("BidAsk")：买卖一价与交易所时间一起到达
+_TICK_BY_TICK_TYPES = {FEED_LAST: "Last", FEED_ALL_LAST: "AllLast", FEED_BIDASK: "BidAsk"}
+
+
+@dataclass
+class Instrument:
+    """行情合约配置，symbol即IB的localSymbol"""
+    symbol: str
+    root: str = "GC"
+    sec_type: str = "FUT"
+    exchange: str = "COMEX"
+    currency: str = "USD"
+    # 订阅方式，见FEED_*；逐笔模式不经过价格/时间戳匹配，但IB对同时订阅数有限制
+    feed: str = FEED_MKTDATA
+
+    @classmethod
+    def parse(cls, spec) -> "Instrument":
+        """支持Instrument、dict配置或仅本地代码字符串（默认GC/COMEX期货）"""
+        if isinstance(spec, Instrument):
+            return spec
+        if isinstance(spec, dict):
+            return cls(**spec)
+        return cls(symbol=str(spec))
+
+
+def load_instruments(path: str) -> List[Instrument]:
+    """从JSON配置加载合约列表，如 [{"symbol": "SIK5", "root": "SI"}, "GCJ5"]"""
+    with open(path, encoding="utf-8") as f:
+        return [Instrument.parse(spec) for spec in json.load(f)]
+
+
+class _Matcher:
+    """单个合约的价格/时间戳配对器（每个合约一把锁，互不争用）
+
+    第一层缓存：价格和时间戳各一个双端队列，元素为(值, 本地接收时间ns)，maxlen防止内存溢出。
+    第二层：新数据到达时先把对侧队首超出窗口的旧数据丢弃，对侧还有数据就与队首配对，
+    否则入队等待。每个元素只入队、出队各一次，单次到达的均摊开销为O(1)；
+    对侧整队都已过期时直接清空，不逐个弹出。
+    """
+    __slots__ = ("window_ns", "prices", "times", "lock", "matched", "dropped_price", "dropped_time")
+
+    def __init__(self, window_ns: int, capacity: int = 100):
+        self.window_ns = window_ns
+        self.prices = deque(maxlen=capacity)
+        self.times = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.matched = 0
+        self.dropped_price = 0
+        self.dropped_time = 0
+
+    def on_price(self, price: float, now_ns: int) -> Optional[int]:
+        """价格到达：配对成功返回服务器时间戳ns，否则返回None"""
+        with self.lock:
+            times = self.times
+            if times:
+                self.dropped_time += self._evict(times, now_ns)
+            if times:
+                self.matched += 1
+                return times.popleft()[0]
+            if len(self.prices) == self.prices.maxlen:
+                self.dropped_price += 1
+            self.prices.append((price, now_ns))
+            return None
+
+    def on_time(self, server_ts_ns: int, now_ns: int) -> Optional[float]:
+        """时间戳到达：配对成功返回价格，否则返回None"""
+        with self.lock:
+            prices = self.prices
+            if prices:
+                self.dropped_price += self._evict(prices, now_ns)
+            if prices:
+                self.matched += 1
+                return prices.popleft()[0]
+            if len(self.times) == self.times.maxlen:
+                self.dropped_time += 1
+            self.times.append((server_ts_ns, now_ns))
+            return None
+
+    def _evict(self, queue: deque, now_ns: int) -> int:
+        """丢弃本地接收时间超出窗口的队首数据，返回丢弃条数"""
+        limit = now_ns - self.window_ns
+        if queue[0][1] >= limit:
+            return 0
+        if queue[-1][1] < limit:
+            n = len(queue)
+            queue.clear()
+            return n
+        n = 0
+        while queue[0][1] < limit:
+            queue.popleft()
+            n += 1
+        return n
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "matched": self.matched,
+            "dropped_price": self.dropped_price,
+            "dropped_time": self.dropped_time,
+            "pending_price": len(self.prices),
+            "pending_time": len(self.times),
+        }
+
+
+class _Feed:
+    """单个合约的订阅状态、价格/时间戳配对器与一档盘口"""
+    __slots__ = ("req_id", "instrument", "symbol", "matcher", "book")
+
+    def __init__(self, req_id: int, instrument: Instrument, window_ns: int):
+        self.req_id = req_id
+        self.instrument = instrument
+        self.symbol = instrument.symbol
+        self.matcher = _Matcher(window_ns)
+        self.book = TopOfBook(instrument.symbol)
+
+
 class MarketDataService(EWrapper, EClient):
-    def __init__(self, bus: EventBus):
+    def __init__(self, bus: EventBus, instruments: Optional[Iterable] = None, match_window: float = 2.0,
+                 resolver: Optional[ContractResolver] = None):
         EClient.__init__(self, self)
         self.bus = bus
-        self.symbol_map = {
-            1: "GCJ5",
-            2: "GCM5"
-        }
+        # 合约解析（conId等）与下单共用，默认取进程内共享的解析器
+        self.resolver = resolver or get_resolver()
+        # 价格与时间戳按本地接收时间配对的窗口（秒）
+        self.match_window = match_window
+        # 配置的合约（默认沿用原先的GCJ5/GCM5）
+        self.instruments: Dict[str, Instrument] = {}
+        for spec in instruments or ("GCJ5", "GCM5"):
+            instrument = Instrument.parse(spec)
+            self.instruments[instrument.symbol] = instrument
+        # reqId -> _Feed，按下标直接索引；reqId单调递增不复用，避免退订后迟到的行情串到新合约
+        self._feeds: List[Optional[_Feed]] = [None]
+        self._by_symbol: Dict[str, _Feed] = {}
+        self._feeds_lock = threading.Lock()
+        self._market_data_type_sent = False
         self._connected = False
         self._connect_lock = threading.Lock()
         self.thread = None
-        #第一层缓存：原始数据队列————代码通过两个 ** 双端队列（deque） ** 分别缓存价格和时间戳：
-        # 线程安全：通过 cache_lock 保证多线程操作的原子性。
-        # 容量控制：maxlen=100 防止内存溢出，自动丢弃旧数据。
-        self.data_cache = {
-            1: {"prices": deque(maxlen=100), "times": deque(maxlen=100)},
-            2: {"prices": deque(maxlen=100), "times": deque(maxlen=100)}
-        }
-        self.cache_lock = threading.Lock()
+        # 收到nextValidId即握手完成、可以发请求
+        self._ready = threading.Event()
+        # _closing：本次断开是主动的，不触发自动重连；_stopped：调用过shutdown，停止重试
+        # 这两个标志只由shutdown和连接流程设置；ibapi内部调用的disconnect()不改动它们
+        self._closing = False
+        self._stopped = False
+        # 连接会话编号：每次connect_ib加一，读线程记住自己的会话，旧会话退出时的disconnect()不影响新会话
+        self._session = 0
+        # 正在重试连接（自动重连线程或connect_with_retry），期间的connectionClosed不再另起重连
+        self._reconnecting = False
+        self._reconnect_lock = threading.Lock()
+        self.auto_reconnect = True
+        self._address = ("127.0.0.1", 7497, 0)
+        # 可选的深度行情子系统（Model.MarketDepth），复用本连接
+        self.depth = None
 
-    def connect_ib(self):
-        """连接IB"""
-        try:
-            self.connect("127.0.0.1", 7497, clientId=0)
-            self.thread = threading.Thread(target=self.run, daemon=True)
-            self.thread.start()
-            time.sleep(1)
+    @property
+    def symbol_map(self) -> Dict[int, str]:
+        """当前订阅的 reqId -> 合约代码"""
+        return {feed.req_id: feed.symbol for feed in self._by_symbol.values()}
+
+    def symbol_of(self, reqId: int) -> Optional[str]:
+        feed = self._feed(reqId)
+        return feed.symbol if feed is not None else None
+
+    def _feed(self, reqId: int) -> Optional[_Feed]:
+        feeds = self._feeds
+        return feeds[reqId] if 0 < reqId < len(feeds) else None
+
+    def connect_ib(self, host="127.0.0.1", port=7497, client_id=0, timeout=5.0):
+        """连接IB并等待握手完成（nextValidId），超时返回False"""
+        with self._connect_lock:
+            self._address = (host, port, client_id)
+            self._session += 1
+            self._closing = False
+            self._ready.clear()
+            try:
+                # socket连不上时ibapi不抛异常，只在内部disconnect()并回调error(502)
+                self.connect(host, port, clientId=client_id)
+                if not self.isConnected():
+                    log.error("连接失败: %s:%s不可达", host, port)
+                    return False
+                self._start_reader()
+            except Exception as e:
+                log.error("连接失败: %s", e)
+                return False
+            if not self._ready.wait(timeout):
+                log.warning("等待IB握手超时(%.1f秒)", timeout)
+                self._closing = True
+                super().disconnect()
+                return False
             return True
-        except Exception as e:
-            print(f"连接失败: {e}")
+
+    def _start_reader(self):
+        """启动本会话的消息处理线程（EClient.run）"""
+        thread = threading.Thread(target=self.run, name="ib-reader", daemon=True)
+        thread.session = self._session
+        self.thread = thread
+        thread.start()
+
+    def connect_with_retry(self, retries=3, timeout=5.0, base_delay=0.5, max_delay=30.0):
+        """指数退避（带抖动）重试连接，成功后重新订阅已有的合约；retries为None时一直重试"""
+        self._stopped = False
+        with self._reconnect_lock:
+            self._reconnecting = True
+        return self._retry_connect(retries, timeout, base_delay, max_delay)
+
+    def _retry_connect(self, retries=None, timeout=5.0, base_delay=0.5, max_delay=30.0):
+        """调用前须已置_reconnecting，结束时清除"""
+        try:
+            host, port, client_id = self._address
+            delays = backoff_delays(retries - 1 if retries else None, base_delay, max_delay)
+            attempt = 0
+            while not self._stopped:
+                attempt += 1
+                if self.connect_ib(host, port, client_id, timeout):
+                    log.info("第%d次连接IB成功", attempt)
+                    self.resubscribe()
+                    return True
+                delay = next(delays, None)
+                if delay is None or self._stopped:
+                    return False
+                log.warning("第%d次连接失败，%.1f秒后重试...", attempt, delay)
+                time.sleep(delay)
             return False
+        finally:
+            with self._reconnect_lock:
+                self._reconnecting = False
+
+    def nextValidId(self, orderId: int):
+        super().nextValidId(orderId)
+        self._connected = True
+        self._ready.set()
 
     def error(self, reqId, errorCode, errorString, advancedOrderRejectJson=None):
         if errorCode == 504 and not self._connected:
             return
-        print(f"行情错误: reqId={reqId}, code={errorCode}, msg={errorString}")
+        self.resolver.on_error(reqId)
+        if errorCode == 1101:
+            # TWS与IB服务器恢复连接但行情订阅已丢失，需要重新订阅
+            log.warning("IB连接恢复，订阅已丢失，重新订阅")
+            self.resubscribe()
+            return
+        log.warning("行情错误: reqId=%s, code=%s, msg=%s", reqId, errorCode, errorString)
 
     def connectAck(self):
         self._connected = True
 
     def connectionClosed(self):
         self._connected = False
+        self._ready.clear()
+        self._market_data_type_sent = False
+        if self._closing or self._stopped or not self.auto_reconnect:
+            return
+        # 连接失败时ibapi内部的disconnect()也会回调这里：连接流程或重试进行中不另起重连
+        if self._connect_lock.locked():
+            return
+        with self._reconnect_lock:
+            if self._reconnecting:
+                return
+            self._reconnecting = True
+        # 回调在IB读线程上，重连放到独立线程，不阻塞（也不join）读线程
+        log.warning("IB连接断开，开始自动重连")
+        threading.Thread(target=self._retry_connect, name="ib-reconnect", daemon=True).start()
 
     def reqMarketDataType(self, dataType):
         super().reqMarketDataType(dataType)
-        print(f"[Debug] 请求市场数据类型: {dataType}")
+        log.debug("请求市场数据类型: %s", dataType)
+
+    def subscribe(self, symbol=None):
+        """订阅合约：不传参数时订阅全部配置的合约；可传本地代码、Instrument或dict配置
 
-    def subscribe(self):
+        会等待合约解析结果，不能在IB读线程（回调）里调用。
+        """
         if not self._connected:
-            print("未连接IB")
+            log.warning("未连接IB")
             return
+        if symbol is None:
+            instruments = list(self.instruments.values())
+        else:
+            instrument = Instrument.parse(symbol)
+            instruments = [self.instruments.setdefault(instrument.symbol, instrument)]
+        # 未缓存的合约一次性并发解析，之后的订阅都带conId
+        self.resolver.resolve(self, instruments)
+        for instrument in instruments:
+            self._subscribe(instrument)
+        log.info("已发送订阅请求")
+
+    def _subscribe(self, instrument: Instrument):
+        with self._feeds_lock:
+            if instrument.symbol in self._by_symbol:
+                return
+            req_id = len(self._feeds)
+            feed = _Feed(req_id, instrument, int(self.match_window * 1_000_000_000))
+            self._feeds.append(feed)
+            self._by_symbol[instrument.symbol] = feed
+        self._request(feed)
 
-        contract1 = self._create_contract(self.symbol_map[1])
-        contract2 = self._create_contract(self.symbol_map[2])
+    def resubscribe(self):
+        """重连后按原reqId重新发送全部有效订阅（新连接上不会有旧请求的迟到行情）"""
+        with self._feeds_lock:
+            feeds = list(self._by_symbol.values())
+        self._market_data_type_sent = False
+        for feed in feeds:
+            self._request(feed)
+        if feeds:
+            log.info("已重新订阅%d个合约", len(feeds))
+        if self.depth is not None:
+            self.depth.resubscribe()
 
-        self.reqMarketDataType(3)
-        self.reqMktData(1, contract1, "", False, False, [])
-        self.reqMktData(2, contract2, "", False, False, [])
-        print("已发送订阅请求")
+    def attach_depth(self, depth):
+        """挂载深度行情子系统，之后可用subscribe_depth订阅"""
+        self.depth = depth
+        depth.attach(self)
 
-    def _create_contract(self, localSymbol):
-        contract = Contract()
-        contract.symbol = "GC"
-        contract.localSymbol = localSymbol
-        contract.secType = "FUT"
-        contract.exchange = "COMEX"
-        contract.currency = "USD"
-        return contract
+    def subscribe_depth(self, symbol):
+        """订阅深度行情（需先attach_depth）"""
+        instrument = Instrument.parse(symbol)
+        instrument = self.instruments.get(instrument.symbol, instrument)
+        self.resolver.resolve(self, [instrument])
+        self.depth.subscribe(instrument)
+
+    def _request(self, feed: _Feed):
+        instrument = feed.instrument
+        req_id = feed.req_id
+        contract = self._create_contract(instrument)
+        if instrument.feed == FEED_MKTDATA:
+            if not self._market_data_type_sent:
+                self.reqMarketDataType(3)
+                self._market_data_type_sent = True
+            self.reqMktData(req_id, contract, "", False, False, [])
+        else:
+            self.reqTickByTickData(req_id, contract, _TICK_BY_TICK_TYPES[instrument.feed], 0, False)
+        log.debug("订阅 %s reqId=%s feed=%s", instrument.symbol, req_id, instrument.feed)
+
+    def unsubscribe(self, symbol: str):
+        """退订合约"""
+        with self._feeds_lock:
+            feed = self._by_symbol.pop(symbol, None)
+            if feed is None:
+                return
+            self._feeds[feed.req_id] = None
+        if self._connected:
+            if feed.instrument.feed == FEED_MKTDATA:
+                self.cancelMktData(feed.req_id)
+            else:
+                self.cancelTickByTickData(feed.req_id)
+        log.info("已退订 %s reqId=%s", symbol, feed.req_id)
+
+    def _create_contract(self, instrument: Instrument):
+        return self.resolver.contract(instrument)
+
+    def updateMktDepth(self, reqId, position, operation, side, price, size):
+        if self.depth is not None:
+            self.depth.on_update(reqId, position, operation, side, price, size)
+
+    def updateMktDepthL2(self, reqId, position, marketMaker, operation, side, price, size, isSmartDepth):
+        if self.depth is not None:
+            self.depth.on_update(reqId, position, operation, side, price, size)
+
+    def contractDetails(self, reqId, contractDetails):
+        self.resolver.on_details(reqId, contractDetails)
+
+    def contractDetailsEnd(self, reqId):
+        self.resolver.on_end(reqId)
 
     def tickString(self, reqId: int, tickType: int, value: str):
         super().tickString(reqId, tickType, value)
         if tickType == 88:  # 仅处理延时时间戳
             try:
-                server_timestamp = int(value)
-                with self.cache_lock:
-                    self.data_cache[reqId]["times"].append((
-                        server_timestamp,
-                        time.time()   # 本地接收时间戳
-                    ))
-                    self._try_emit_event(reqId)
+                server_ts_ns = int(value) * 1_000_000_000  # 秒 -> 纳秒
             except ValueError:
-                pass
+                return
+            feed = self._feed(reqId)
+            if feed is None:
+                return
+            price = feed.matcher.on_time(server_ts_ns, time.monotonic_ns())
+            if price is not None:
+                # 发布时使用服务器时间戳
+                self.bus.publish(MarketDataEvent.make(feed.symbol, price, server_ts_ns, 88))
 
     def tickPrice(self, reqId, tickType, price, attrib):
         super().tickPrice(reqId, tickType, price, attrib)
-        symbol = self.symbol_map.get(reqId)
-        if symbol and price > 0:
-            with self.cache_lock:
-                self.data_cache[reqId]["prices"].append((
-                    price,
-                    time.time()  # 本地接收时间戳
-                ))
-                self._try_emit_event(reqId)
-
-    def format_timestamp(self,timestamp_ms):
-        dt_utc =datetime.fromtimestamp(int(timestamp_ms) , tz=timezone.utc)
+        feed = self._feed(reqId)
+        if feed is not None and price > 0:
+            index = _PRICE_INDEX.get(tickType)
+            if index is None:
+                return
+            if feed.book.update(index, price, time.time_ns()):
+                self.bus.publish(feed.book.snapshot())
+            if index != BOOK_LAST:
+                return
+            # tickType 88是最新成交时间，只与成交价配对，买卖价走QuoteEvent
+            server_ts_ns = feed.matcher.on_price(price, time.monotonic_ns())
+            if server_ts_ns is not None:
+                self.bus.publish(MarketDataEvent.make(feed.symbol, price, server_ts_ns, 88))
+
+    def tickSize(self, reqId, tickType, size):
+        super().tickSize(reqId, tickType, size)
+        index = _SIZE_INDEX.get(tickType)
+        if index is None:
+            return
+        feed = self._feed(reqId)
+        if feed is not None and feed.book.update(index, float(size), time.time_ns()):
+            self.bus.publish(feed.book.snapshot())
+
+    def tickByTickAllLast(self, reqId, tickType, time, price, size, tickAttribLast, exchange, specialConditions):
+        """逐笔成交：价格与交易所时间（秒）同时到达，直接发布"""
+        feed = self._feed(reqId)
+        if feed is not None and price > 0:
+            ts_ns = time * 1_000_000_000
+            book = feed.book
+            changed = book.update(BOOK_LAST, price, ts_ns)
+            changed = book.update(BOOK_LAST_SIZE, float(size), ts_ns) or changed
+            if changed:
+                self.bus.publish(book.snapshot())
+            self.bus.publish(MarketDataEvent.make(feed.symbol, price, ts_ns, TICK_LAST))
+
+    def tickByTickBidAsk(self, reqId, time, bidPrice, askPrice, bidSize, askSize, tickAttribBidAsk):
+        """逐笔买卖一价：分别发布买价与卖价事件"""
+        feed = self._feed(reqId)
+        if feed is None:
+            return
+        ts_ns = time * 1_000_000_000
+        book = feed.book
+        changed = False
+        for index, value in ((BOOK_BID, bidPrice), (BOOK_ASK, askPrice),
+                             (BOOK_BID_SIZE, float(bidSize)), (BOOK_ASK_SIZE, float(askSize))):
+            if value > 0:
+                changed = book.update(index, value, ts_ns) or changed
+        if changed:
+            self.bus.publish(book.snapshot())
+        if bidPrice > 0:
+            self.bus.publish(MarketDataEvent.make(feed.symbol, bidPrice, ts_ns, TICK_BID))
+        if askPrice > 0:
+            self.bus.publish(MarketDataEvent.make(feed.symbol, askPrice, ts_ns, TICK_ASK))
+
+    def format_timestamp(self, ts_ns):
+        dt_utc = datetime.fromtimestamp(ts_ns / 1e9, tz=timezone.utc)
         return dt_utc.strftime("%Y-%m-%d %H:%M:%S.%f")
 
-    #  第二层缓存：时间窗口匹配。匹配逻辑：
-    #  比较队列头部元素的本地接收时间差。
-    #  若时间差 ≤ 阈值（代码中为2秒），则认为属于同一时刻的数据。
-    #  发布事件时使用服务器时间戳（time_entry[0]）保证时间准确性。
-    #  容错处理：当时间差过大时，丢弃更旧的一侧数据（价格或时间戳），避免队列阻塞。
-    def _try_emit_event(self, reqId):
-        """时间-价格匹配核心逻辑"""
-        cache = self.data_cache[reqId]
-        while len(cache["prices"]) > 0 and len(cache["times"]) > 0:
-            price_entry = cache["prices"][0]
-            time_entry = cache["times"][0]
-
-            # 计算本地接收时间差（毫秒）
-            local_diff = abs(price_entry[1] - time_entry[1])
-
-            if local_diff <= 2:  # 时间窗口阈值
-                symbol = self.symbol_map[reqId]
-                # 发布事件并移除数据
-                self.bus.publish(MarketDataEvent(
-                    symbol=symbol,
-                    price=price_entry[0],
-                    time=str(time_entry[0]),  # 使用服务器时间戳
-                    tickType=88
-                ))
-                # 移除已匹配数据
-                cache["prices"].popleft()
-                cache["times"].popleft()
-            else:
-                # 丢弃较旧的数据
-                if price_entry[1] < time_entry[1]:
-                    cache["prices"].popleft()
-                else:
-                    cache["times"].popleft()
+    def quote(self, symbol: str) -> Optional[QuoteEvent]:
+        """合约当前的一档盘口快照"""
+        feed = self._by_symbol.get(symbol)
+        return feed.book.snapshot() if feed is not None else None
+
+    def matcher_stats(self) -> Dict[str, Dict[str, int]]:
+        """各合约的配对计数：matched、dropped_price、dropped_time及当前待配对数"""
+        return {symbol: feed.matcher.stats() for symbol, feed in list(self._by_symbol.items())}
 
     def disconnect(self):
-        """正确断开连接"""
-        if self._connected:
+        """只关闭socket，不改变重连状态
+
+        ibapi在EClient.run()结束和connect()连不上时会在内部调用disconnect()；主动停止请用shutdown()。
+        旧会话的读线程退出时调用的disconnect()直接忽略，不能关掉已重连的新会话。
+        """
+        session = getattr(threading.current_thread(), "session", None)
+        if session is not None and session != self._session:
+            return
+        super().disconnect()
+
+    def shutdown(self):
+        """主动断开并停止自动重连、重试"""
+        self._closing = True
+        self._stopped = True
+        # 握手未完成（未收到connectAck）时socket也可能已打开，一并关闭
+        if self._connected or self.isConnected():
             try:
                 # 调用EClient的disconnect方法
                 super().disconnect()
@@ -173,7 +576,7 @@ class MarketDataService(EWrapper, EClient):
                     self.thread.join(timeout=5)
             finally:
                 self._connected = False
-                print("[IB] 连接已断开")
+                log.info("[IB] 连接已断开")
 
 if __name__ == "__main__":
     bus = EventBus()
@@ -181,7 +584,7 @@ if __name__ == "__main__":
 
 
     def print_price(event: MarketDataEvent):
-        print(f"[Debug] {event.symbol} Price: {event.price} tickType:{event.tickType} time={event.time} = {md.format_timestamp(event.time)}")
+        print(f"[Debug] {event.symbol} Price: {event.price} tickType:{event.tickType} ts_ns={event.ts_ns} = {md.format_timestamp(event.ts_ns)}")
 
 
 
@@ -195,6 +598,6 @@ if __name__ == "__main__":
             while True:
                 time.sleep(1)
         except KeyboardInterrupt:
-            md.disconnect()
+            md.shutdown()
     else:
         print("连接IB失败")
\ No newline at end of file
@@ -0,0 +1,259 @@
+# Model/MarketDepth.py
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from Core.EventBus import Event, EventBus, fast_constructor
+from Core.Log import get_logger
+from Model.ContractResolver import ContractResolver, get_resolver
+
+log = get_logger("MarketDepth")
+
+# IB updateMktDepth的side/operation取值
+SIDE_ASK = 0
+SIDE_BID = 1
+OP_INSERT = 0
+OP_UPDATE = 1
+OP_DELETE = 2
+
+# 深度行情的reqId从这里开始，避开行情与合约解析的reqId
+_REQ_ID_BASE = 1 << 25
+
+
+@dataclass(frozen=True, slots=True)
+class DepthEvent(Event):
+    """单个合约按lots手成交的深度分析；未能完全成交的一侧vwap为0"""
+    symbol: str
+    lots: float
+    bid_vwap: float  # 卖出lots手的成交均价
+    ask_vwap: float  # 买入lots手的成交均价
+    bid_filled: float
+    ask_filled: float
+    seq: int
+    ts_ns: int
+
+
+@dataclass(frozen=True, slots=True)
+class ExecutableSpreadEvent(Event):
+    """两条腿各成交lots手的可执行价差：buy为买leg1卖leg2，sell为卖leg1买leg2"""
+    symbol_pair: Tuple[str, str]
+    lots: float
+    buy: float
+    sell: float
+    ts_ns: int
+
+
+DepthEvent.make = staticmethod(fast_constructor(DepthEvent))
+ExecutableSpreadEvent.make = staticmethod(fast_constructor(ExecutableSpreadEvent))
+
+
+class OrderBook:
+    """按档位存储的深度盘口，下标0为最优价
+
+    IB按档位号推送增删改：改为O(1)原地写；增删只在不超过rows档的数组里移动，
+    每个合约一把锁，读快照时才复制。
+    """
+    __slots__ = ("symbol", "rows", "prices", "sizes", "seq", "ts_ns", "lock")
+
+    def __init__(self, symbol: str, rows: int = 10):
+        self.symbol = symbol
+        self.rows = rows
+        # 下标与IB的side一致：0卖方，1买方
+        self.prices = (array("d"), array("d"))
+        self.sizes = (array("d"), array("d"))
+        self.seq = 0
+        self.ts_ns = 0
+        self.lock = threading.Lock()
+
+    def apply(self, position: int, operation: int, side: int, price: float, size: float):
+        prices = self.prices[side]
+        sizes = self.sizes[side]
+        depth = len(prices)
+        if operation == OP_UPDATE and position < depth:
+            prices[position] = price
+            sizes[position] = size
+        elif operation == OP_DELETE:
+            if position < depth:
+                del prices[position]
+                del sizes[position]
+        else:
+            # 插入，或更新了尚不存在的档位（断线重订后常见）
+            position = min(position, depth)
+            prices.insert(position, price)
+            sizes.insert(position, size)
+            if depth >= self.rows:
+                prices.pop()
+                sizes.pop()
+        self.seq += 1
+
+    def clear(self):
+        for side in (SIDE_ASK, SIDE_BID):
+            del self.prices[side][:]
+            del self.sizes[side][:]
+        self.seq += 1
+
+    def vwap(self, side: int, lots: float) -> Tuple[float, float]:
+        """从最优档开始吃lots手的成交均价和可成交量；量不足时均价为0"""
+        if lots <= 0:
+            raise ValueError(f"vwap的手数必须大于0: {lots}")
+        prices = self.prices[side]
+        sizes = self.sizes[side]
+        remaining = lots
+        notional = 0.0
+        for i in range(len(prices)):
+            take = sizes[i] if sizes[i] < remaining else remaining
+            notional += take * prices[i]
+            remaining -= take
+            if remaining <= 0:
+                return notional / lots, lots
+        return 0.0, lots - remaining
+
+    def snapshot(self) -> Dict[str, List[Tuple[float, float]]]:
+        """复制当前盘口：{"bids": [(价, 量)...], "asks": [...]}"""
+        with self.lock:
+            return {
+                "bids": list(zip(self.prices[SIDE_BID], self.sizes[SIDE_BID])),
+                "asks": list(zip(self.prices[SIDE_ASK], self.sizes[SIDE_ASK])),
+            }
+
+
+class MarketDepth:
+    """深度行情子系统：挂在MarketDataService上，复用其IB连接
+
+    MarketDataService把updateMktDepth/updateMktDepthL2转给这里；每次更新后发布该合约的
+    DepthEvent，以及包含该合约的各个合约对的ExecutableSpreadEvent（只发分析结果，不复制盘口）。
+    """
+
+    def __init__(self, bus: EventBus, lots: float = 1, rows: int = 10,
+                 pairs: Iterable[Tuple[str, str]] = (), resolver: Optional[ContractResolver] = None):
+        if lots <= 0:
+            raise ValueError(f"深度分析的手数必须大于0: {lots}")
+        self.bus = bus
+        self.lots = lots
+        self.rows = rows
+        self.resolver = resolver or get_resolver()
+        self.client = None
+        self._books: Dict[int, OrderBook] = {}
+        self._by_symbol: Dict[str, OrderBook] = {}
+        self._req_ids: Dict[str, int] = {}
+        self._instruments: Dict[str, object] = {}
+        self._next_req_id = _REQ_ID_BASE
+        self._lock = threading.Lock()
+        # 合约 -> 包含它的合约对，更新时只算相关的价差
+        self._pairs: Dict[str, List[Tuple[str, str]]] = {}
+        for pair in pairs:
+            self.add_pair(pair)
+
+    def add_pair(self, pair: Tuple[str, str]):
+        pair = tuple(pair)
+        for symbol in pair:
+            self._pairs.setdefault(symbol, []).append(pair)
+
+    def attach(self, client):
+        """绑定提供IB连接的服务（需有reqMktDepth/cancelMktDepth）"""
+        self.client = client
+
+    def subscribe(self, instrument):
+        """订阅深度行情；instrument需有symbol/root/sec_type/exchange/currency"""
+        with self._lock:
+            if instrument.symbol in self._req_ids:
+                return
+            req_id = self._next_req_id
+            self._next_req_id += 1
+            book = OrderBook(instrument.symbol, self.rows)
+            self._books[req_id] = book
+            self._by_symbol[instrument.symbol] = book
+            self._req_ids[instrument.symbol] = req_id
+            self._instruments[instrument.symbol] = instrument
+        self._request(req_id, instrument)
+
+    def _request(self, req_id: int, instrument):
+        self.client.reqMktDepth(req_id, self.resolver.contract(instrument), self.rows, False, [])
+        log.debug("订阅深度 %s reqId=%s rows=%s", instrument.symbol, req_id, self.rows)
+
+    def unsubscribe(self, symbol: str):
+        with self._lock:
+            req_id = self._req_ids.pop(symbol, None)
+            if req_id is None:
+                return
+            self._books.pop(req_id, None)
+            self._by_symbol.pop(symbol, None)
+            self._instruments.pop(symbol, None)
+        self.client.cancelMktDepth(req_id, False)
+
+    def resubscribe(self):
+        """重连后清空旧盘口（IB会重新推送全量档位）并重新订阅"""
+        with self._lock:
+            items = [(req_id, self._instruments[symbol], self._books[req_id])
+                     for symbol, req_id in self._req_ids.items()]
+        for req_id, instrument, book in items:
+            with book.lock:
+                book.clear()
+            self._request(req_id, instrument)
+
+    def book(self, symbol: str) -> Optional[OrderBook]:
+        return self._by_symbol.get(symbol)
+
+    def on_update(self, reqId: int, position: int, operation: int, side: int, price: float, size) -> bool:
+        """updateMktDepth转发入口；不是深度行情的reqId时返回False"""
+        book = self._books.get(reqId)
+        if book is None:
+            return False
+        lots = self.lots
+        ts_ns = time.time_ns()
+        with book.lock:
+            book.apply(position, operation, side, price, float(size))
+            book.ts_ns = ts_ns
+            bid_vwap, bid_filled = book.vwap(SIDE_BID, lots)
+            ask_vwap, ask_filled = book.vwap(SIDE_ASK, lots)
+            seq = book.seq
+        self.bus.publish(DepthEvent.make(book.symbol, lots, bid_vwap, ask_vwap, bid_filled, ask_filled, seq, ts_ns))
+        for pair in self._pairs.get(book.symbol, ()):
+            self._publish_spread(pair, ts_ns)
+        return True
+
+    def _publish_spread(self, pair: Tuple[str, str], ts_ns: int):
+        book1 = self._by_symbol.get(pair[0])
+        book2 = self._by_symbol.get(pair[1])
+        if book1 is None or book2 is None:
+            return
+        lots = self.lots
+        # 两条腿分别加锁读取，不同时持有两把锁
+        with book1.lock:
+            bid1, bid1_filled = book1.vwap(SIDE_BID, lots)
+            ask1, ask1_filled = book1.vwap(SIDE_ASK, lots)
+        with book2.lock:
+            bid2, bid2_filled = book2.vwap(SIDE_BID, lots)
+            ask2, ask2_filled = book2.vwap(SIDE_ASK, lots)
+        if min(bid1_filled, ask1_filled, bid2_filled, ask2_filled) < lots:
+            return
+        self.bus.publish(ExecutableSpreadEvent.make(pair, lots, ask1 - bid2, bid1 - ask2, ts_ns))
+
+
+# ===== 调试代码 =====
+if __name__ == "__main__":
+    bus = EventBus()
+    bus.subscribe(DepthEvent, lambda e: print(f"[Debug] {e}"))
+    bus.subscribe(ExecutableSpreadEvent, lambda e: print(f"[Debug] {e}"))
+    bus.start()
+
+    class _Instrument:
+        def __init__(self, symbol):
+            self.symbol, self.root, self.sec_type, self.exchange, self.currency = symbol, "GC", "FUT", "COMEX", "USD"
+
+    class _Client:
+        def reqMktDepth(self, *args):
+            pass
+
+    depth = MarketDepth(bus, lots=3, pairs=[("GCJ5", "GCM5")], resolver=ContractResolver(None))
+    depth.attach(_Client())
+    depth.subscribe(_Instrument("GCJ5"))
+    depth.subscribe(_Instrument("GCM5"))
+    for req_id, base in ((_REQ_ID_BASE, 2000.0), (_REQ_ID_BASE + 1, 2010.0)):
+        for level in range(3):
+            depth.on_update(req_id, level, OP_INSERT, SIDE_BID, base - level * 0.1, 2)
+            depth.on_update(req_id, level, OP_INSERT, SIDE_ASK, base + 0.1 + level * 0.1, 2)
+    time.sleep(0.5)
+    bus.stop()
@@ -1,93 +1,271 @@
 # Model/SpreadCalculator.py
-from Core.EventBus import Event
+from Core.EventBus import Event, fast_constructor
+from Core.Log import get_logger
 from Model.MarketData import MarketDataEvent  # 新增关键导入
+from Model.MarketData3 import QuoteEvent, TRADE_TICK_TYPES
+from array import array
+from bisect import bisect_right
 from dataclasses import dataclass
 import threading
-from datetime import datetime
-from typing import Tuple
+from typing import Optional, Tuple
 import time  # 添加这行到代码文件顶部
 
-@dataclass
+log = get_logger("SpreadCalculator")
+
+@dataclass(frozen=True, slots=True)
 class SpreadEvent(Event):
     spread: float
-    timestamp: datetime
-    symbol_pair: Tuple[str, str]  # 例如 ("GCJ5", "GCZ5")
-    prices: Tuple[float, float]  # 对应symbol_pair的价格
+    ts_ns: int  # 计算时刻（epoch纳秒）
+    symbol_pair: Tuple[str, ...]  # 例如 ("GCJ5", "GCZ5")；SpreadEngine的多腿结构为全部腿
+    prices: Tuple[float, ...]  # 对应symbol_pair的价格
+    name: str  # 价差结构标识，如"GCJ5-GCZ5"、比例价差"GCJ5/GCZ5"；同腿不同权重的结构各不相同，下游按它区分序列
+
+
+SpreadEvent.make = staticmethod(fast_constructor(SpreadEvent))
+
+
+class _LegBuffer:
+    """单条腿按时间排序的最近window个tick：时间戳/价格两列，容量为2*window
+
+    写满后把最后window个tick搬回开头（均摊O(1)），有效数据始终连续，可直接二分。
+    """
+    __slots__ = ("window", "ts", "prices", "start", "end")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.ts = array("q", bytes(16 * window))
+        self.prices = array("d", bytes(16 * window))
+        self.start = 0
+        self.end = 0
+
+    def append(self, price: float, ts_ns: int) -> bool:
+        """按时间顺序写入；返回是否为该腿最新的tick
+
+        晚到的tick按自己的时间戳插入到对应位置（只移动其后的少数tick），比窗口内最早的tick还早时丢弃。
+        """
+        end = self.end
+        if end == len(self.ts):
+            keep = self.window - 1
+            self.ts[:keep] = self.ts[end - keep:end]
+            self.prices[:keep] = self.prices[end - keep:end]
+            self.start, end = 0, keep
+            self.end = end
+        if end > self.start and ts_ns < self.ts[end - 1]:
+            i = bisect_right(self.ts, ts_ns, self.start, end)
+            if i == self.start and end - self.start >= self.window:
+                return False
+            self.ts[i + 1:end + 1] = self.ts[i:end]
+            self.prices[i + 1:end + 1] = self.prices[i:end]
+            self.ts[i] = ts_ns
+            self.prices[i] = price
+            newest = False
+        else:
+            self.ts[end] = ts_ns
+            self.prices[end] = price
+            newest = True
+        self.end = end + 1
+        if self.end - self.start > self.window:
+            self.start += 1
+        return newest
+
+    def asof(self, ts_ns: int, interpolate: bool) -> Optional[Tuple[float, int, int]]:
+        """时间戳<=ts_ns的最后一个tick：(价格, 该tick时间戳, 该tick时间戳)
+
+        interpolate=True且其后还有tick时按时间线性插值，返回(插值价, 前一tick时间戳, 后一tick时间戳)。
+        """
+        i = bisect_right(self.ts, ts_ns, self.start, self.end) - 1
+        if i < self.start:
+            return None
+        price = self.prices[i]
+        t0 = self.ts[i]
+        if interpolate and i + 1 < self.end:
+            t1 = self.ts[i + 1]
+            if t1 > t0:
+                price += (self.prices[i + 1] - price) * (ts_ns - t0) / (t1 - t0)
+            return price, t0, t1
+        return price, t0, t0
 
 
 class SpreadCalculator:
-    def __init__(self, bus, symbol_pair=("GCJ5", "GCZ5"), max_time_diff=10):
+    """两腿价差：按交易所时间做as-of连接
+
+    每条腿保留最近window个tick的环形缓冲（内存有界）。一条腿的tick到达时，
+    在另一条腿的缓冲里二分查找该时刻之前的最后一个tick配对（interpolate=True时取前后两个tick的线性插值），
+    而不是直接取另一条腿的最新价；配对（或插值用到的）tick与当前tick相差max_time_diff秒以上时跳过。
+    同一条腿晚到的tick按自己的时间戳插入缓冲，只用于之后的配对。
+
+    发布策略：min_move=None时每个tick都发布；min_move=0时价差不变不发布；
+    min_move>0时相对上次发布的价差变动不足min_move不发布。max_rate限制每秒最多发布的次数，
+    间隔内被压下的价差只保留最新一个，到期由常驻的补发线程发布（尾沿），不会丢掉最后的价差。
+    """
+
+    def __init__(self, bus, symbol_pair=("GCJ5", "GCZ5"), max_time_diff=10, inline=False, source="last",
+                 window=1024, interpolate=False, min_move=None, max_rate=None):
         self.bus = bus
         self.symbol_pair = symbol_pair
+        self.name = f"{symbol_pair[0]}-{symbol_pair[1]}"
         self.max_time_diff = max_time_diff  # 允许的最大时间差（秒）
+        self._max_time_diff_ns = int(max_time_diff * 1_000_000_000)
+        self.interpolate = interpolate
 
-        # 使用有序字典存储最新数据
-        # 第一层缓存：品种最新数据存储
-        self.market_data = {
-            symbol_pair[0]: {"price": None, "timestamp": None},
-            symbol_pair[1]: {"price": None, "timestamp": None}
+        # 第一层缓存：每条腿按服务器时间排序的tick缓冲
+        self.buffers = {
+            symbol_pair[0]: _LegBuffer(window),
+            symbol_pair[1]: _LegBuffer(window)
         }
         self.lock = threading.Lock()
 
+        # 发布策略及计数
+        self.min_move = min_move
+        self._min_move = (min_move or 0.0) * (1 - 1e-9)  # 容忍价位相减的浮点误差
+        self.max_rate = max_rate
+        self._interval_ns = int(1_000_000_000 / max_rate) if max_rate else 0
+        self._last_spread = None  # 上次发布（或待补发）的价差
+        self._next_emit_ns = 0
+        self._pending = None  # 限速期间待补发的最新事件
+        # 限速时由一个常驻线程负责尾沿补发，有新的待补发事件时唤醒
+        self._wake = threading.Event()
+        self._closed = False
+        self._flusher = None
+        if self._interval_ns:
+            self._flusher = threading.Thread(target=self._run_flusher, name="spread-flush", daemon=True)
+            self._flusher.start()
+        self.published = 0
+        self.suppressed_unchanged = 0  # 因价差未变/变动不足被丢弃
+        self.suppressed_rate = 0  # 因限速被后来的价差覆盖
+
         # 明确指定事件类型（关键修正）
-        bus.subscribe(MarketDataEvent, self.handle_market_data)
+        # inline=True时直接在行情发布线程上计算价差，省去一次队列切换
+        # source="mid"时用一档盘口的买卖中间价，两条腿取同一种价格
+        self.source = source
+        if source == "mid":
+            bus.subscribe(QuoteEvent, self.handle_quote, inline=inline)
+        else:
+            bus.subscribe(MarketDataEvent, self.handle_market_data, inline=inline)
 
     def handle_market_data(self, event: MarketDataEvent):
         """处理行情事件（带类型注解）"""
-        print("DEBUG")
+        # 只处理目标品种的成交价（逐笔买卖一价事件不参与，否则价差在买价与卖价间跳动）
+        buffer = self.buffers.get(event.symbol)
+        if buffer is None or event.tickType not in TRADE_TICK_TYPES:
+            return
+        log.debug("收到行情 %s %s", event.symbol, event.price)
         with self.lock:
-            # 只处理目标品种
-            if event.symbol not in self.symbol_pair:
-                return
+            # 晚到的tick只补进缓冲供之后的as-of查找，不再发布过去时刻的价差
+            if buffer.append(event.price, event.ts_ns):
+                self._calculate_spread(event.symbol, event.price, event.ts_ns)
+
+    def handle_quote(self, event: QuoteEvent):
+        """处理盘口快照：中间价有效时更新"""
+        mid = event.mid
+        buffer = self.buffers.get(event.symbol)
+        if mid <= 0 or buffer is None:
+            return
+        with self.lock:
+            if buffer.append(mid, event.ts_ns):
+                self._calculate_spread(event.symbol, mid, event.ts_ns)
 
-            # 更新数据并转换时间戳
-
-            try:
-                timestamp = datetime.fromtimestamp(int(event.time) / 1000)  # 毫秒转秒
-            except:
-                timestamp = None
-
-            self.market_data[event.symbol] = {
-                "price": event.price,
-                "timestamp": timestamp
-            }
-
-            # 当两个合约都有有效数据时
-            if all(v["timestamp"] for v in self.market_data.values()):
-                self._calculate_spread()
-
-    def _calculate_spread(self):
-        """带时间有效性验证的价差计算"""
-        data1 = self.market_data[self.symbol_pair[0]]
-        data2 = self.market_data[self.symbol_pair[1]]
-
-        time_diff = abs((data1["timestamp"] - data2["timestamp"]).total_seconds())
-
-        if time_diff <= self.max_time_diff:
-            spread = data1["price"] - data2["price"]
-            self.bus.publish(SpreadEvent(
-                spread=spread,
-                timestamp=datetime.now(),
-                symbol_pair=self.symbol_pair,
-                prices=(data1["price"], data2["price"])
-            ))
+    def asof(self, symbol: str, ts_ns: int) -> Optional[float]:
+        """某条腿在ts_ns时刻的价格（按interpolate设置），无数据时为None"""
+        with self.lock:
+            match = self.buffers[symbol].asof(ts_ns, self.interpolate)
+        return match[0] if match else None
+
+    def _calculate_spread(self, symbol: str, price: float, ts_ns: int):
+        """用另一条腿在ts_ns时刻的as-of价格计算价差"""
+        leg1, leg2 = self.symbol_pair
+        other = leg2 if symbol == leg1 else leg1
+        match = self.buffers[other].asof(ts_ns, self.interpolate)
+        if match is None:
+            return
+        # 插值时前后两个tick都不能离ts_ns超过max_time_diff
+        other_price, before_ts, after_ts = match
+        time_diff_ns = max(ts_ns - before_ts, after_ts - ts_ns)
+
+        if time_diff_ns <= self._max_time_diff_ns:
+            price1, price2 = (price, other_price) if symbol == leg1 else (other_price, price)
+            self._emit(price1 - price2, price1, price2)
         else:
-            print(f"[Spread] 时间差 {time_diff:.2f}s 超过阈值 {self.max_time_diff}s，跳过计算")
+            log.debug("[Spread] 时间差 %.2fs 超过阈值 %ss，跳过计算", time_diff_ns / 1e9, self.max_time_diff)
+
+    def _emit(self, spread: float, price1: float, price2: float):
+        """按发布策略发布价差（持有self.lock时调用）"""
+        if self.min_move is not None:
+            last = self._last_spread
+            if last is not None and (spread == last or abs(spread - last) < self._min_move):
+                self.suppressed_unchanged += 1
+                return
+            self._last_spread = spread
+        event = SpreadEvent.make(spread, time.time_ns(), self.symbol_pair, (price1, price2), self.name)
+        if self._interval_ns:
+            now = time.monotonic_ns()
+            if now < self._next_emit_ns:
+                if self._pending is not None:
+                    self.suppressed_rate += 1
+                else:
+                    self._wake.set()
+                self._pending = event
+                return
+            self._next_emit_ns = now + self._interval_ns
+            if self._pending is not None:
+                self._pending = None
+                self.suppressed_rate += 1
+        self.published += 1
+        self.bus.publish(event)
+
+    def flush(self):
+        """立即发布限速期间压下的最新价差（补发线程到期或关闭时调用）"""
+        with self.lock:
+            event = self._pending
+            if event is None:
+                return
+            self._pending = None
+            self._next_emit_ns = time.monotonic_ns() + self._interval_ns
+            self.published += 1
+            self.bus.publish(event)
+
+    def _run_flusher(self):
+        """等到限速间隔结束，若仍有待补发的价差则发布"""
+        wake = self._wake
+        while not self._closed:
+            with self.lock:
+                deadline = self._next_emit_ns if self._pending is not None else None
+            if deadline is None:
+                wake.wait()
+                wake.clear()
+                continue
+            delay = (deadline - time.monotonic_ns()) / 1e9
+            if delay > 0:
+                wake.wait(delay)
+                wake.clear()
+                continue
+            self.flush()
+
+    def close(self):
+        """停止补发线程，并发布仍压着的最新价差"""
+        self._closed = True
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    def stats(self) -> dict:
+        return {"published": self.published, "suppressed_unchanged": self.suppressed_unchanged,
+                "suppressed_rate": self.suppressed_rate}
 
 
 # ===== 调试代码 =====
 if __name__ == "__main__":
     from Core.EventBus import EventBus
-    from datetime import timedelta
 
     bus = EventBus()
-    calculator = SpreadCalculator(bus)
+    calculator = SpreadCalculator(bus, interpolate=True)
 
 
     def print_spread(event: SpreadEvent):
         # 使用正确的属性symbol_pair和prices
         price1, price2 = event.prices
-        time_diff = (datetime.now() - event.timestamp).total_seconds()
+        time_diff = (time.time_ns() - event.ts_ns) / 1e9
 
         print(f"[价差] {event.symbol_pair[0]}-{event.symbol_pair[1]} = {event.spread:.2f} "
               f"(计算延迟: {time_diff:.3f}s)")
@@ -97,12 +275,16 @@ if __name__ == "__main__":
     bus.start()
 
     # 生成测试数据
-    test_time = datetime.now()
+    test_ns = time.time_ns()
+    second = 1_000_000_000
     test_events = [
-        MarketDataEvent("GCJ5", 2000.0, str(int(test_time.timestamp() * 1000)), 88),
-        MarketDataEvent("GCZ5", 2010.0, str(int((test_time + timedelta(seconds=5)).timestamp() * 1000)), 88),
-        MarketDataEvent("GCJ5", 2020.0, str(int((test_time + timedelta(seconds=15)).timestamp() * 1000)), 88),
-        MarketDataEvent("GCZ5", 2030.0, str(int((test_time + timedelta(seconds=20)).timestamp() * 1000)), 88),
+        MarketDataEvent("GCJ5", 2000.0, test_ns, 88),
+        MarketDataEvent("GCZ5", 2010.0, test_ns + 5 * second, 88),
+        MarketDataEvent("GCZ5", 2012.0, test_ns + 9 * second, 88),
+        # 晚到的GCJ5：与GCZ5在7s处的插值价2011.0配对，而不是最新的2012.0
+        MarketDataEvent("GCJ5", 2005.0, test_ns + 7 * second, 88),
+        MarketDataEvent("GCJ5", 2020.0, test_ns + 15 * second, 88),
+        MarketDataEvent("GCZ5", 2030.0, test_ns + 20 * second, 88),
     ]
 
     for event in test_events:
@@ -0,0 +1,220 @@
+# Model/SpreadEngine.py
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from Core.EventBus import EventBus
+from Core.Log import get_logger
+from Model.MarketData import MarketDataEvent
+from Model.MarketData3 import QuoteEvent, TRADE_TICK_TYPES
+from Model.SpreadCalculator import SpreadEvent
+
+log = get_logger("SpreadEngine")
+
+
+@dataclass(frozen=True)
+class SpreadDef:
+    """价差定义：sum(w_i * p_i)；ratio=True时为prod(p_i ** w_i)，如(1, -1)即p1/p2"""
+    legs: Tuple[str, ...]
+    weights: Tuple[float, ...]
+    ratio: bool = False
+
+    @property
+    def name(self) -> str:
+        """结构标识：A-B、A/B、A-2*B+C、A*C/B^2"""
+        if not self.ratio:
+            text = ""
+            for symbol, weight in zip(self.legs, self.weights):
+                sign = "-" if weight < 0 else "+"
+                size = abs(weight)
+                text += f"{sign}{symbol}" if size == 1 else f"{sign}{size:g}*{symbol}"
+            return text[1:] if text.startswith("+") else text
+        up = [f"{s}" if w == 1 else f"{s}^{w:g}" for s, w in zip(self.legs, self.weights) if w > 0]
+        down = [f"{s}" if w == -1 else f"{s}^{-w:g}" for s, w in zip(self.legs, self.weights) if w < 0]
+        return "*".join(up or ["1"]) + ("/" + "/".join(down) if down else "")
+
+
+class SpreadEngine:
+    """多结构价差引擎：只订阅一次行情，按合约->结构索引只重算用到该腿的价差
+
+    支持任意权重的多腿结构（价差、比例价差、蝶式、秃鹰）。各腿最新价放在共享的价格向量里，
+    每条腿预先切出用到它的结构的权重子矩阵，一个tick只做一次矩阵-向量乘；
+    比例模式在对数价格上做同样的乘法再取exp。一个tick的工作量只与包含该腿的结构数有关。
+    """
+
+    def __init__(self, bus: EventBus, pairs: Iterable[Tuple[str, str]] = (), max_time_diff: float = 10,
+                 inline: bool = False, source: str = "last"):
+        self.bus = bus
+        self.max_time_diff = max_time_diff
+        self._max_time_diff_ns = int(max_time_diff * 1_000_000_000)
+        # 腿：合约 -> 下标；价格/对数价格/时间戳向量（时间戳0表示尚无数据）
+        self._legs: Dict[str, int] = {}
+        self._prices = np.zeros(0)
+        self._log_prices = np.zeros(0)
+        self._ts = np.zeros(0, dtype=np.int64)
+        # 结构：定义列表及其下标
+        self._defs: List[SpreadDef] = []
+        self._def_index: Dict[SpreadDef, int] = {}
+        self._names: List[str] = []
+        # 结构 -> 各腿下标（与definition.legs同序）
+        self._def_legs: List[Tuple[int, ...]] = []
+        # 腿下标 -> (结构下标, 权重子矩阵, 各结构腿下标矩阵, 其中比例结构的行号, 比例结构权重子矩阵)，登记结构时重建
+        self._by_leg: List[tuple] = []
+        self.lock = threading.Lock()
+        for pair in pairs:
+            self.add_pair(pair)
+        if source == "mid":
+            bus.subscribe(QuoteEvent, self.handle_quote, inline=inline)
+        else:
+            bus.subscribe(MarketDataEvent, self.handle_market_data, inline=inline)
+
+    def add_pair(self, pair: Tuple[str, str]) -> int:
+        """登记普通价差p1 - p2（重复登记返回已有下标）"""
+        return self.add_spread(tuple(pair), (1.0, -1.0))
+
+    def add_spread(self, legs: Sequence[str], weights: Sequence[float], ratio: bool = False) -> int:
+        """登记多腿结构，如蝶式add_spread(("GCJ5", "GCM5", "GCQ5"), (1, -2, 1))"""
+        if len(legs) != len(weights):
+            raise ValueError("legs与weights长度不一致")
+        definition = SpreadDef(tuple(legs), tuple(float(w) for w in weights), ratio)
+        with self.lock:
+            index = self._def_index.get(definition)
+            if index is not None:
+                return index
+            for symbol in definition.legs:
+                if symbol not in self._legs:
+                    self._legs[symbol] = len(self._legs)
+            n = len(self._legs)
+            grow = n - len(self._prices)
+            if grow:
+                self._prices = np.concatenate((self._prices, np.zeros(grow)))
+                self._log_prices = np.concatenate((self._log_prices, np.zeros(grow)))
+                self._ts = np.concatenate((self._ts, np.zeros(grow, dtype=np.int64)))
+            index = len(self._defs)
+            self._defs.append(definition)
+            self._names.append(definition.name)
+            self._def_legs.append(tuple(self._legs[symbol] for symbol in definition.legs))
+            self._def_index[definition] = index
+            self._rebuild()
+            return index
+
+    def _rebuild(self):
+        """重建权重矩阵和每条腿的子矩阵（只在登记结构时执行）"""
+        n_legs = len(self._legs)
+        weights = np.zeros((len(self._defs), n_legs))
+        for row, definition in enumerate(self._defs):
+            for symbol, weight in zip(definition.legs, definition.weights):
+                weights[row, self._legs[symbol]] += weight
+        # 各结构的腿下标补齐到相同宽度（用自身第一条腿补），取时间戳时一次花式索引
+        width = max(len(legs) for legs in self._def_legs)
+        leg_cols = np.array([legs + (legs[0],) * (width - len(legs)) for legs in self._def_legs], dtype=np.intp)
+        ratio = np.array([d.ratio for d in self._defs], dtype=bool)
+        by_leg = []
+        for leg in range(n_legs):
+            rows = np.flatnonzero((leg_cols == leg).any(axis=1))
+            sub = weights[rows]
+            ratio_rows = np.flatnonzero(ratio[rows])
+            by_leg.append((rows.tolist(), np.ascontiguousarray(sub), leg_cols[rows], ratio_rows,
+                           np.ascontiguousarray(sub[ratio_rows])))
+        self._by_leg = by_leg
+
+    @property
+    def pairs(self) -> List[Tuple[str, ...]]:
+        return [d.legs for d in self._defs]
+
+    @property
+    def definitions(self) -> List[SpreadDef]:
+        return list(self._defs)
+
+    def handle_market_data(self, event: MarketDataEvent):
+        # 只用成交价，买卖一价走source="mid"
+        if event.tickType in TRADE_TICK_TYPES:
+            self._update(event.symbol, event.price, event.ts_ns)
+
+    def handle_quote(self, event: QuoteEvent):
+        mid = event.mid
+        if mid > 0:
+            self._update(event.symbol, mid, event.ts_ns)
+
+    def _update(self, symbol: str, price: float, ts_ns: int):
+        leg = self._legs.get(symbol)
+        if leg is None:
+            return
+        now = time.time_ns()
+        with self.lock:
+            prices = self._prices
+            stamps = self._ts
+            prices[leg] = price
+            stamps[leg] = ts_ns
+            if price > 0:
+                self._log_prices[leg] = math.log(price)
+            rows, weights, leg_cols, ratio_rows, ratio_weights = self._by_leg[leg]
+            values = weights @ prices
+            if len(ratio_rows):
+                values[ratio_rows] = np.exp(ratio_weights @ self._log_prices)
+            # 各结构的腿都有数据且时间差不超过阈值才发布
+            leg_ts = stamps[leg_cols]
+            oldest = leg_ts.min(axis=1)
+            lag = leg_ts.max(axis=1) - oldest
+            if oldest.min() > 0 and lag.max() <= self._max_time_diff_ns:
+                valid = range(len(rows))
+            else:
+                valid = np.flatnonzero((oldest > 0) & (lag <= self._max_time_diff_ns)).tolist()
+            # 转成Python标量后再逐个构造事件，避免逐个取numpy标量
+            values = values.tolist()
+            leg_prices = prices[leg_cols].tolist()
+            defs = self._defs
+            names = self._names
+            events = []
+            for i in valid:
+                row = rows[i]
+                legs = defs[row].legs
+                events.append(SpreadEvent.make(values[i], now, legs, tuple(leg_prices[i][:len(legs)]), names[row]))
+        # 锁外发布，inline订阅者不会在持锁时被调用
+        for event in events:
+            self.bus.publish(event)
+
+    def values(self) -> np.ndarray:
+        """所有结构的当前值（按登记顺序；腿缺数据时结果无意义）"""
+        with self.lock:
+            out = np.zeros(len(self._defs))
+            for definition_index, definition in enumerate(self._defs):
+                idx = [self._legs[s] for s in definition.legs]
+                w = np.array(definition.weights)
+                if definition.ratio:
+                    out[definition_index] = math.exp(w @ self._log_prices[idx])
+                else:
+                    out[definition_index] = w @ self._prices[idx]
+            return out
+
+    def spread(self, legs: Sequence[str]) -> Optional[float]:
+        """结构当前值（按腿查找第一个匹配的定义；任一腿无数据时为None）"""
+        legs = tuple(legs)
+        for index, definition in enumerate(self._defs):
+            if definition.legs == legs:
+                if not all(self._ts[self._legs[s]] for s in legs):
+                    return None
+                return float(self.values()[index])
+        return None
+
+
+# ===== 调试代码 =====
+if __name__ == "__main__":
+    bus = EventBus()
+    symbols = [f"GC{m}5" for m in "GJMQVZ"]
+    pairs = [(a, b) for i, a in enumerate(symbols) for b in symbols[i + 1:]]
+    engine = SpreadEngine(bus, pairs, inline=True)
+    count = [0]
+    bus.subscribe(SpreadEvent, lambda e: count.__setitem__(0, count[0] + 1), inline=True)
+
+    t0 = time.time_ns()
+    n = 100_000
+    begin = time.perf_counter()
+    for k in range(n):
+        bus.publish(MarketDataEvent.make(symbols[k % len(symbols)], 2000.0 + k % 10, t0 + k, 88))
+    elapsed = time.perf_counter() - begin
+    print(f"[Debug] {len(pairs)}个合约对，{n}个tick，{count[0]}个价差事件，每tick {elapsed / n * 1e6:.2f}us")
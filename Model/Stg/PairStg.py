@@ -1,39 +1,65 @@
-from Core.EventBus import Event
+from Core.EventBus import Event, fast_constructor
+from Core.Log import get_logger
 from dataclasses import dataclass
+from Model.RollingStats import SpreadStatsEvent
 from Model.SpreadCalculator import SpreadEvent
 
+log = get_logger("PairStg")
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class TradingSignal(Event):
     direction: str  # BUY/SELL
+    ts_ns: int = 0  # 触发信号的价差时刻（epoch纳秒）
+
+
+TradingSignal.make = staticmethod(fast_constructor(TradingSignal))
 
 
 class PairTradingStrategy:
-    def __init__(self, bus, threshold=2.0):
+    def __init__(self, bus, threshold=2.0, inline=False, z_entry=None):
+        self.bus = bus
         self.threshold = threshold
-        bus.subscribe(SpreadEvent, self.on_spread)
+        # z_entry不为None时改用滚动z-score（需要SpreadStats发布SpreadStatsEvent）
+        self.z_entry = z_entry
+        # inline=True时与价差计算在同一调用栈内执行（行情->价差->信号无线程切换）
+        if z_entry is None:
+            bus.subscribe(SpreadEvent, self.on_spread, lane="strategy", inline=inline)
+        else:
+            bus.subscribe(SpreadStatsEvent, self.on_spread_stats, lane="strategy", inline=inline)
 
     def on_spread(self, event: SpreadEvent):
         if abs(event.spread) > self.threshold:
             direction = "BUY" if event.spread < 0 else "SELL"
-            print(f"[Stg Debug] 触发交易信号: {direction}")
-            # 实际应通过bus发布信号
-            # bus.publish(TradingSignal(direction))
+            log.info("触发交易信号: %s spread=%.2f", direction, event.spread)
+            # 信号走高优先级lane，不会排在积压的行情之后
+            self.bus.publish(TradingSignal.make(direction, event.ts_ns))
+
+    def on_spread_stats(self, event: SpreadStatsEvent):
+        # 窗口未满时zscore为0，不会触发
+        if abs(event.zscore) > self.z_entry:
+            direction = "BUY" if event.zscore < 0 else "SELL"
+            log.info("触发交易信号: %s spread=%.2f z=%.2f beta=%.3f",
+                     direction, event.spread, event.zscore, event.beta)
+            self.bus.publish(TradingSignal.make(direction, event.ts_ns))
 
 
 # ===== 调试代码 =====
 if __name__ == "__main__":
+    import time
+
     from Core.EventBus import EventBus
-    from Model.SpreadCalculator import SpreadEvent
+    from Model.RollingStats import SpreadStats
 
     bus = EventBus()
-    strategy = PairTradingStrategy(bus, threshold=1.5)
+    SpreadStats(bus, window=5)
+    strategy = PairTradingStrategy(bus, z_entry=1.5)
 
-    # 手动测试
+    # 手动测试：输入两腿价格，窗口满5个样本后按z-score触发
     bus.start()
     try:
         while True:
-            spread = float(input("输入测试价差: "))
-            bus.publish(SpreadEvent(spread))
+            p1, p2 = map(float, input("输入两腿价格: ").split())
+            bus.publish(SpreadEvent.make(p1 - p2, time.time_ns(), ("LEG1", "LEG2"), (p1, p2), "LEG1-LEG2"))
     except KeyboardInterrupt:
-        bus.stop()
\ No newline at end of file
+        bus.stop()
@@ -0,0 +1,320 @@
+# Model/TickStore.py
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from Core.EventBus import EventBus
+from Core.Log import get_logger
+from Model.MarketData import MarketDataEvent
+
+log = get_logger("TickStore")
+
+_NS = 1_000_000_000
+_DAY_NS = 86400 * _NS
+# 每隔INDEX_STRIDE行记一个时间戳作为稀疏索引
+INDEX_STRIDE = 4096
+_INITIAL_ROWS = 1 << 16
+# (文件名, dtype)；三列等长，按行号对齐
+_COLUMNS = (("ts", np.int64), ("price", np.float64), ("tick_type", np.int8))
+
+
+class TickColumns(NamedTuple):
+    """一个日分区内某时间段的列视图（已写完的分区直接指向内存映射文件，不复制）"""
+    ts: np.ndarray
+    price: np.ndarray
+    tick_type: np.ndarray
+
+
+def _day_of(ts_ns: int) -> str:
+    """UTC日期分区名"""
+    return datetime.fromtimestamp(ts_ns // _DAY_NS * 86400, tz=timezone.utc).strftime("%Y%m%d")
+
+
+class _Partition:
+    """一个合约一天的数据：三列内存映射文件 + 稀疏时间索引 + meta.json（行数）"""
+
+    def __init__(self, path: str, writable: bool):
+        self.path = path
+        self.writable = writable
+        self.count = 0
+        self.capacity = 0
+        self.columns: Dict[str, np.memmap] = {}
+        self.index = np.empty(0, dtype=np.int64)
+        meta = os.path.join(path, "meta.json")
+        if os.path.exists(meta):
+            with open(meta, encoding="utf-8") as f:
+                self.count = json.load(f)["count"]
+        if self.count or not writable:
+            self._map(max(self.count, 1) if writable else self.count)
+        else:
+            os.makedirs(path, exist_ok=True)
+            self._map(_INITIAL_ROWS)
+        # 索引按列数据重建，只读INDEX_STRIDE分之一的行
+        if self.count:
+            self.index = np.array(self.columns["ts"][:self.count:INDEX_STRIDE])
+
+    def _map(self, rows: int):
+        """映射（可写时按需扩容）各列文件
+
+        Windows上无法扩展仍被映射的文件，扩容前先落盘并释放旧映射，再按新长度重新映射。
+        """
+        old, self.columns = self.columns, {}
+        for column in old.values():
+            column.flush()
+        old = column = None
+        for name, dtype in _COLUMNS:
+            file = os.path.join(self.path, name + ".bin")
+            if self.writable:
+                size = rows * np.dtype(dtype).itemsize
+                with open(file, "ab") as f:
+                    if f.tell() < size:
+                        f.truncate(size)
+                self.columns[name] = np.memmap(file, dtype=dtype, mode="r+")
+            elif rows:
+                self.columns[name] = np.memmap(file, dtype=dtype, mode="r", shape=(rows,))
+        if self.columns:
+            self.capacity = len(self.columns["ts"])
+
+    def append(self, ts: np.ndarray, price: np.ndarray, tick_type: np.ndarray):
+        n = len(ts)
+        start = self.count
+        end = start + n
+        if end > self.capacity:
+            capacity = self.capacity or _INITIAL_ROWS
+            while capacity < end:
+                capacity *= 2
+            self.flush()
+            self._map(capacity)
+        cols = self.columns
+        cols["ts"][start:end] = ts
+        cols["price"][start:end] = price
+        cols["tick_type"][start:end] = tick_type
+        # 新跨过的INDEX_STRIDE整数倍行号追加进稀疏索引
+        first = -(-start // INDEX_STRIDE) * INDEX_STRIDE
+        if first < end:
+            self.index = np.concatenate((self.index, cols["ts"][first:end:INDEX_STRIDE]))
+        self.count = end
+
+    def flush(self):
+        if not self.writable or not self.columns:
+            return
+        for column in self.columns.values():
+            column.flush()
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"count": self.count}, f)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+
+    def _bound(self, ts: np.ndarray, count: int, value: int) -> int:
+        """第一个ts>=value的行号：先在稀疏索引里二分定位块，再在块内二分"""
+        block = max(int(np.searchsorted(self.index, value, "left")) - 1, 0)
+        lo = block * INDEX_STRIDE
+        hi = min(lo + INDEX_STRIDE + 1, count)
+        return lo + int(np.searchsorted(ts[lo:hi], value, "left"))
+
+    def slice(self, start_ns: int, end_ns: int) -> Optional[TickColumns]:
+        count = self.count
+        if not count:
+            return None
+        ts = self.columns["ts"]
+        lo = self._bound(ts, count, start_ns)
+        hi = self._bound(ts, count, end_ns)
+        if lo >= hi:
+            return None
+        columns = TickColumns(ts[lo:hi], self.columns["price"][lo:hi], self.columns["tick_type"][lo:hi])
+        if self.writable:
+            # 可写分区扩容时要重新映射，返回副本，外部持有的视图不会占住旧映射
+            return TickColumns(*(np.array(column) for column in columns))
+        return columns
+
+
+class TickStore:
+    """列式tick存储：每合约每天一个分区，列文件内存映射
+
+    订阅MarketDataEvent时只把tick放进队列（inline，在发布线程上完成，且早于总线的合并），
+    由后台线程批量写入，不占用分发线程。read()按时间段返回列视图（已写完的分区零拷贝）。
+    写入顺序即时间顺序：同一合约的tick按服务器时间到达。
+    """
+
+    def __init__(self, bus: Optional[EventBus], root: str = "data/ticks", flush_interval: float = 1.0):
+        self.root = root
+        self.flush_interval = flush_interval
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._writers: Dict[Tuple[str, str], _Partition] = {}
+        self._readers: Dict[Tuple[str, str], _Partition] = {}
+        self._lock = threading.Lock()
+        self.written = 0
+        self._thread = threading.Thread(target=self._run, name="tick-store", daemon=True)
+        self._thread.start()
+        if bus is not None:
+            bus.subscribe(MarketDataEvent, self.on_market_data, inline=True)
+
+    def on_market_data(self, event: MarketDataEvent):
+        self._queue.put((event.symbol, event.ts_ns, event.price, event.tickType))
+
+    def append(self, symbol: str, ts_ns: int, price: float, tick_type: int):
+        """直接写入一条tick（回放、补数据用），同样经后台线程"""
+        self._queue.put((symbol, ts_ns, price, tick_type))
+
+    def close(self):
+        """写完队列中剩余的tick并落盘"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def sync(self, timeout: Optional[float] = None) -> bool:
+        """等待此前入队的tick全部写入并落盘"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def truncate(self, symbol: str, ts_ns: int, rows: int):
+        """把ts_ns所在日分区的行数截回rows（断点续传时丢弃检查点之后写入的行）"""
+        self.sync()
+        key = (symbol, _day_of(ts_ns))
+        with self._lock:
+            part = self._writers.get(key)
+            if part is None:
+                path = os.path.join(self.root, symbol, key[1])
+                if not os.path.exists(os.path.join(path, "meta.json")):
+                    return
+                part = self._writers[key] = _Partition(path, writable=True)
+            if part.count > rows:
+                log.info("分区%s/%s从%d行截回%d行", symbol, key[1], part.count, rows)
+                part.count = rows
+                part.index = part.index[:-(-rows // INDEX_STRIDE)]
+                part.flush()
+
+    # ---------- 后台写入 ----------
+    def _run(self):
+        get = self._queue.get
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+            batch = []
+            markers = []
+            stop = item is None
+            # 一次取走队列里已有的所有tick，按(合约, 日期)分组成列批量写
+            while not stop:
+                if isinstance(item, tuple):
+                    if item:
+                        batch.append(item)
+                else:
+                    markers.append(item)  # sync()放入的threading.Event
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                stop = item is None
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception:
+                    log.exception("tick写入失败，丢弃%d条", len(batch))
+            now = time.monotonic()
+            if stop or markers or now - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = now
+            for marker in markers:
+                marker.set()
+            if stop:
+                return
+
+    def _write(self, batch: List[tuple]):
+        # 按整数天号分组，每组只格式化一次日期
+        groups: Dict[Tuple[str, int], List[tuple]] = {}
+        for item in batch:
+            groups.setdefault((item[0], item[1] // _DAY_NS), []).append(item)
+        for (symbol, day), items in groups.items():
+            key = (symbol, _day_of(day * _DAY_NS))
+            part = self._writers.get(key)
+            if part is None:
+                part = _Partition(os.path.join(self.root, key[0], key[1]), writable=True)
+                with self._lock:
+                    self._writers[key] = part
+            _, ts, price, tick_type = zip(*items)
+            with self._lock:
+                part.append(np.array(ts, dtype=np.int64), np.array(price, dtype=np.float64),
+                            np.array(tick_type, dtype=np.int8))
+            self.written += len(items)
+
+    def _flush(self):
+        with self._lock:
+            for part in self._writers.values():
+                part.flush()
+
+    # ---------- 读取 ----------
+    def read(self, symbol: str, start_ns: int, end_ns: int) -> List[TickColumns]:
+        """[start_ns, end_ns)内的tick，每个日分区一个视图，按时间顺序排列
+
+        已写完的分区为零拷贝视图；本进程仍在写入的分区返回副本。
+        """
+        result = []
+        day_ns = start_ns - start_ns % _DAY_NS
+        while day_ns < end_ns:
+            part = self._partition(symbol, _day_of(day_ns))
+            if part is not None:
+                with self._lock:
+                    columns = part.slice(start_ns, end_ns)
+                if columns is not None:
+                    result.append(columns)
+            day_ns += _DAY_NS
+        return result
+
+    def read_concat(self, symbol: str, start_ns: int, end_ns: int) -> TickColumns:
+        """同read，但拼成一段连续数组（跨天时会复制）"""
+        parts = self.read(symbol, start_ns, end_ns)
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return TickColumns(*(np.empty(0, dtype=dtype) for _, dtype in _COLUMNS))
+        return TickColumns(*(np.concatenate(column) for column in zip(*parts)))
+
+    def _partition(self, symbol: str, day: str) -> Optional[_Partition]:
+        key = (symbol, day)
+        part = self._writers.get(key)
+        if part is not None:
+            return part
+        part = self._readers.get(key)
+        if part is not None:
+            return part
+        path = os.path.join(self.root, symbol, day)
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+        part = _Partition(path, writable=False)
+        # 当天的分区可能还在被其他进程写入，不缓存
+        if day != _day_of(time.time_ns()):
+            self._readers[key] = part
+        return part
+
+    def symbols(self) -> List[str]:
+        return sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []
+
+
+# ===== 调试代码 =====
+if __name__ == "__main__":
+    import tempfile
+
+    store = TickStore(None, root=tempfile.mkdtemp())
+    t0 = time.time_ns() - 7 * _DAY_NS
+    n = 2_000_000
+    begin = time.perf_counter()
+    for k in range(n):
+        store.append("GCJ5", t0 + k * 300_000_000, 2000.0 + (k % 100) * 0.1, 4)
+    store.close()
+    print(f"[Debug] 写入{store.written}条用时{time.perf_counter() - begin:.2f}s")
+
+    reader = TickStore(None, root=store.root)
+    begin = time.perf_counter()
+    parts = reader.read("GCJ5", t0 + _DAY_NS // 2, t0 + 5 * _DAY_NS)
+    elapsed = (time.perf_counter() - begin) * 1000
+    print(f"[Debug] 读取{sum(len(p.ts) for p in parts)}条（{len(parts)}个分区）用时{elapsed:.2f}ms")
+    reader.close()
@@ -30,14 +30,14 @@ class DebugMarketSpread:
         """注册调试用事件处理器"""
         # 行情打印
         self.bus.subscribe(MarketDataEvent, lambda e: print(
-            f"[行情] {e.symbol} 价格: {e.price} 时间: {self.md.format_timestamp(e.time)}"
+            f"[行情] {e.symbol} 价格: {e.price} 时间: {self.md.format_timestamp(e.ts_ns)}"
         ))
 
         # 价差打印
         self.bus.subscribe(SpreadEvent, lambda e: print(
             f"[价差] {e.symbol_pair[0]}-{e.symbol_pair[1]} = {e.spread:.2f} "
             f"价格: {e.prices[0]:.2f}/{e.prices[1]:.2f} "
-            f"时间差: {(datetime.now() - e.timestamp).total_seconds():.3f}s"
+            f"时间差: {(time.time_ns() - e.ts_ns) / 1e9:.3f}s"
         ))
 
     def run(self):
@@ -45,15 +45,14 @@ class DebugMarketSpread:
         self.bus.start()
 
         if self.md.connect_ib():
-            print("成功连接IB，等待3秒初始化...")
-            time.sleep(3)
+            print("成功连接IB")
             self.md.subscribe()
 
             try:
                 while True:  # 保持主线程运行
                     time.sleep(1)
             except KeyboardInterrupt:
-                self.md.disconnect()
+                self.md.shutdown()
                 self.bus.stop()
         else:
             print("连接IB失败")
@@ -3,10 +3,14 @@ import tkinter as tk
 from tkinter import ttk
 from Core.EventBus import EventBus
 from Model.MarketData import MarketDataEvent
+from Model.MarketData3 import TRADE_TICK_TYPES
 from Model.SpreadCalculator import SpreadEvent
+from Core.Log import get_logger
 import time
 import threading
 
+log = get_logger("View.TradingGUI")
+
 
 class TradingGUI(tk.Tk):
     def __init__(self, bus: EventBus, leg1="GCJ5", leg2="GCM5"):
@@ -98,11 +102,14 @@ class TradingGUI(tk.Tk):
 
     def _register_events(self):
         """事件注册"""
-        self.bus.subscribe(MarketDataEvent, self.handle_market_data)
-        self.bus.subscribe(SpreadEvent, self.handle_spread)
+        self.bus.subscribe(MarketDataEvent, self.handle_market_data, lane="gui")
+        self.bus.subscribe(SpreadEvent, self.handle_spread, lane="gui")
 
     def handle_market_data(self, event: MarketDataEvent):
         """处理行情事件"""
+        # 只显示成交价，买一卖一价不刷新最新价
+        if event.tickType not in TRADE_TICK_TYPES:
+            return
         self.after(0, self._update_price_ui, event)
 
     def handle_spread(self, event: SpreadEvent):
@@ -117,7 +124,7 @@ class TradingGUI(tk.Tk):
                 return
 
             # 转换时间戳
-            timestamp = int(event.time) // 1000  # 转换为秒
+            timestamp = event.ts_ns // 1_000_000_000  # 纳秒转换为秒
             readable_time = time.strftime("%H:%M:%S", time.localtime(timestamp))
 
             # 更新数据
@@ -135,7 +142,7 @@ class TradingGUI(tk.Tk):
                 self.leg2_time.config(text=f"最后更新: {readable_time}")
 
         except Exception as e:
-            print(f"更新价格UI异常: {str(e)}")
+            log.error("更新价格UI异常: %s", e)
 
     def _update_spread_ui(self, event: SpreadEvent):
         """更新价差显示"""
@@ -155,11 +162,11 @@ class TradingGUI(tk.Tk):
 
     def on_buy(self):
         """买入信号"""
-        print(f"[交易信号] BUY {self.leg1} / SELL {self.leg2}")
+        log.info("[交易信号] BUY %s / SELL %s", self.leg1, self.leg2)
 
     def on_sell(self):
         """卖出信号"""
-        print(f"[交易信号] SELL {self.leg1} / BUY {self.leg2}")
+        log.info("[交易信号] SELL %s / BUY %s", self.leg1, self.leg2)
 
     def on_close(self):
         """窗口关闭处理"""
@@ -174,16 +181,10 @@ def mock_data(bus):
     count = 0
     while True:
         count += 1
-        timestamp = int(time.time() * 1000)
+        ts_ns = time.time_ns()
         for i, symbol in enumerate(symbols):
             price = 1800.0 + (count * 2) + (i * 1)
-            event = MarketDataEvent(
-                symbol=symbol,
-                price=price,
-                time=str(timestamp),
-                tickType=88
-            )
-            bus.publish(event)
+            bus.publish(MarketDataEvent.make(symbol, price, ts_ns, 88))
         time.sleep(1)
 
 
@@ -3,47 +3,76 @@ import threading
 import time
 from ibapi.client import EClient
 from ibapi.wrapper import EWrapper
-from ibapi.contract import Contract
 from ibapi.order import Order
 import tkinter as tk  # 新增导入
 from tkinter import ttk
+from Core.Log import get_logger
+from Core.Retry import backoff_delays
+from Model.ContractResolver import get_resolver
+from Model.MarketData3 import Instrument
+
+log = get_logger("View.BuySell")
 
 class TradingService(EWrapper, EClient):
-    def __init__(self, leg1, leg2):
+    def __init__(self, leg1, leg2, resolver=None):
         EClient.__init__(self, self)
         self.leg1 = leg1
         self.leg2 = leg2
+        # 与行情共用合约解析缓存，下单合约带conId
+        self.resolver = resolver or get_resolver()
         self.next_order_id = None
         self.order_id_lock = threading.Lock()
         self.connected = False
+        # 收到nextValidId后才有可用订单ID，此时才算就绪
+        self._ready = threading.Event()
 
     def error(self, reqId, errorCode, errorString, advancedOrderRejectJson):
-        print(f"交易错误: {errorCode} - {errorString}")
+        self.resolver.on_error(reqId)
+        log.warning("交易错误: %s - %s", errorCode, errorString)
+
+    def contractDetails(self, reqId, contractDetails):
+        self.resolver.on_details(reqId, contractDetails)
+
+    def contractDetailsEnd(self, reqId):
+        self.resolver.on_end(reqId)
 
     def nextValidId(self, orderId: int):
         with self.order_id_lock:
             self.next_order_id = orderId
-            print(f"可用订单ID更新: {self.next_order_id}")
-
-    def connect_trading(self):
-        try:
-            self.connect("127.0.0.1", 7497, clientId=1)  # 使用不同clientId
-            self.thread = threading.Thread(target=self.run, daemon=True)
-            self.thread.start()
-            time.sleep(1)
-            return True
-        except Exception as e:
-            print(f"交易连接失败: {e}")
-            return False
+            log.info("可用订单ID更新: %s", self.next_order_id)
+        self._ready.set()
+
+    def connectionClosed(self):
+        self.connected = False
+        self._ready.clear()
+
+    def connect_trading(self, retries=3, timeout=5.0):
+        """连接并等待nextValidId，失败按指数退避（带抖动）重试"""
+        delays = backoff_delays(retries - 1)
+        for attempt in range(1, retries + 1):
+            self._ready.clear()
+            try:
+                self.connect("127.0.0.1", 7497, clientId=1)  # 使用不同clientId
+                # 端口不通时ibapi不抛异常，直接进入下一次重试，不再空等握手
+                if not self.isConnected():
+                    raise ConnectionError("127.0.0.1:7497不可达")
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+                if self._ready.wait(timeout):
+                    # 行情侧已解析过的合约直接命中缓存，不再往返
+                    self.resolver.resolve(self, [Instrument.parse(self.leg1), Instrument.parse(self.leg2)])
+                    return True
+                log.warning("等待交易连接握手超时(%.1f秒)", timeout)
+                self.disconnect()
+            except Exception as e:
+                log.error("交易连接失败: %s", e)
+            delay = next(delays, None)
+            if delay is not None:
+                time.sleep(delay)
+        return False
 
     def create_contract(self, localSymbol):
-        contract = Contract()
-        contract.symbol = "GC"
-        contract.localSymbol = localSymbol
-        contract.secType = "FUT"
-        contract.exchange = "COMEX"
-        contract.currency = "USD"
-        return contract
+        return self.resolver.contract(Instrument.parse(localSymbol))
 
     def create_order(self, action, quantity=1):
         order = Order()
@@ -56,7 +85,7 @@ class TradingService(EWrapper, EClient):
 
     def submit_pair_order(self, leg1_action, leg2_action):
         if not self.connected:
-            print("交易服务未连接")
+            log.warning("交易服务未连接")
             return
 
         leg1_contract = self.create_contract(self.leg1)
@@ -88,11 +117,21 @@ class TradeButtonsView(ttk.Frame):
         self._connect_trading()
 
     def _connect_trading(self):
-        if self.trading_service.connect_trading():
+        """在后台线程连接（含重试，可能持续十几秒），Tk线程用after()轮询结果，界面不冻结"""
+        result = []
+        threading.Thread(target=lambda: result.append(self.trading_service.connect_trading()),
+                         name="trading-connect", daemon=True).start()
+        self.after(100, self._check_trading_connected, result)
+
+    def _check_trading_connected(self, result):
+        if not result:
+            self.after(100, self._check_trading_connected, result)
+            return
+        if result[0]:
             self.trading_service.connected = True
-            print("交易服务连接成功")
+            log.info("交易服务连接成功")
         else:
-            print("交易服务连接失败")
+            log.error("交易服务连接失败")
 
     def _setup_ui(self):
         btn_frame = ttk.Frame(self)
@@ -119,7 +158,7 @@ class TradeButtonsView(ttk.Frame):
             self.trading_service.submit_pair_order("BUY", "SELL")
         elif direction == "SELL":
             self.trading_service.submit_pair_order("SELL", "BUY")
-        print(f"已发送{direction}指令")
+        log.info("已发送%s指令", direction)
 
     # 保留原有的样式配置代码...
 
@@ -3,10 +3,14 @@ import tkinter as tk
 from tkinter import ttk
 from Core.EventBus import EventBus
 from Model.MarketData import MarketDataEvent
+from Model.MarketData3 import TRADE_TICK_TYPES
 from Model.SpreadCalculator import SpreadEvent
+from Core.Log import get_logger
 import time
 from datetime import datetime, timezone
 
+log = get_logger("View.MarketData")
+
 
 class MarketDataView(ttk.Frame):
     def __init__(self, master, bus: EventBus, leg1="GCJ5", leg2="GCM5"):
@@ -63,6 +67,9 @@ class MarketDataView(ttk.Frame):
 
 
     def handle_market_data(self, event: MarketDataEvent):
+        # 只显示成交价，买一卖一价不刷新最新价
+        if event.tickType not in TRADE_TICK_TYPES:
+            return
         self.after(0, self._update_price_ui, event)
 
     def handle_spread(self, event: SpreadEvent):
@@ -71,8 +78,8 @@ class MarketDataView(ttk.Frame):
     def _register_events(self):
         if self.bus is None:
             raise ValueError("Event bus未正确初始化")
-        self.bus.subscribe(MarketDataEvent, self.handle_market_data)
-        self.bus.subscribe(SpreadEvent, self.handle_spread)
+        self.bus.subscribe(MarketDataEvent, self.handle_market_data, lane="gui")
+        self.bus.subscribe(SpreadEvent, self.handle_spread, lane="gui")
 
     def _update_price_ui(self, event: MarketDataEvent):
 
@@ -81,10 +88,7 @@ class MarketDataView(ttk.Frame):
             if symbol not in [self.leg1, self.leg2]:
                 return
 
-            timestamp = int(event.time) // 1000  # 转换为秒
-
-
-            dt_utc = datetime.fromtimestamp(int(event.time), tz=timezone.utc)
+            dt_utc = datetime.fromtimestamp(event.ts_ns / 1e9, tz=timezone.utc)
             readable_time = dt_utc.strftime("%Y-%m-%d %H:%M:%S")
             self.last_update[symbol].update({
                 "price": event.price,
@@ -99,11 +103,10 @@ class MarketDataView(ttk.Frame):
                 self.leg2_time.config(text=f"最后更新: {readable_time}")
 
         except Exception as e:
-            print(f"更新价格UI异常: {str(e)}")
+            log.error("更新价格UI异常: %s", e)
 
     def _update_spread_ui(self, event: SpreadEvent):
-        print(f"[DEBUG] _update_spread_ui:")  # 确认计算逻辑执行
-        print(f"[DEBUG] _update_spread_ui: {event.spread}")  # 确认计算逻辑执行
+        log.debug("_update_spread_ui: %s", event.spread)  # 确认计算逻辑执行
         self.spread_value = event.spread
         self.spread_value_label.config(
             text=f"{event.spread:.2f}",
@@ -148,7 +151,6 @@ if __name__ == "__main__":
 
         def _connect_ib(self):
             if self.md.connect_ib():
-                time.sleep(2)
                 self.md.subscribe()
                 return True
             return False
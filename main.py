@@ -3,22 +3,61 @@ from tkinter import messagebox
 import sys
 import os
 import threading
-from Core.EventBus import EventBus
-from Model.MarketData import MarketDataService
-from Model.SpreadCalculator import SpreadCalculator
+from operator import attrgetter
+from Core.EventBus import ShardedEventBus, PRIORITY_HIGH, PRIORITY_LOW
+from Core.Log import setup_logging
+from Model.MarketData import MarketDataService, MarketDataEvent
+from Model.MarketData3 import QuoteEvent
+from Model.MarketDepth import MarketDepth, DepthEvent, ExecutableSpreadEvent
+from Model.BarAggregator import BarAggregator, BarEvent
+from Model.TickStore import TickStore
+from Model.SpreadCalculator import SpreadCalculator, SpreadEvent
+from Model.RollingStats import SpreadStats, SpreadStatsEvent
+from Model.Stg.PairStg import TradingSignal
 from View.Cluster import TradingCluster
-import time
 
 
 class PairTradingSystem:
     def __init__(self, leg1, leg2):
-        self.bus = EventBus()
-        self.md_service = MarketDataService(self.bus)
+        # 行情按合约、价差按结构名（SpreadEvent.name）分片；GUI订阅者使用独立的gui lane
+        # 交易信号优先于积压的行情分发
+        self.bus = ShardedEventBus(
+            lanes=4,
+            keys={
+                MarketDataEvent: attrgetter("symbol"),
+                QuoteEvent: attrgetter("symbol"),
+                DepthEvent: attrgetter("symbol"),
+                ExecutableSpreadEvent: attrgetter("symbol_pair"),
+                BarEvent: attrgetter("symbol"),
+                SpreadEvent: attrgetter("name"),
+                SpreadStatsEvent: attrgetter("name"),
+            },
+            max_batch=64,
+            priorities={TradingSignal: PRIORITY_HIGH, MarketDataEvent: PRIORITY_LOW, QuoteEvent: PRIORITY_LOW},
+            instrument=True,
+        )
+        # 消费跟不上时只保留每个(合约, tickType)的最新报价
+        self.bus.conflate(MarketDataEvent, attrgetter("symbol", "tickType"))
+        # 盘口快照每个合约只保留最新一份
+        self.bus.conflate(QuoteEvent, attrgetter("symbol"))
+        self.bus.conflate(DepthEvent, attrgetter("symbol"))
+        self.bus.conflate(ExecutableSpreadEvent, attrgetter("symbol_pair"))
+        self.md_service = MarketDataService(self.bus, instruments=[leg1, leg2])
+        # 深度行情：按1手计算两条腿的可执行价差
+        self.md_service.attach_depth(MarketDepth(self.bus, lots=1, pairs=[(leg1, leg2)]))
         self.spread_calculator = SpreadCalculator(
             self.bus,
             symbol_pair=(leg1, leg2),
-            max_time_diff=2
+            max_time_diff=2,
+            inline=True,
+            min_move=0  # 价差不变（只变量或重复价格的tick）不发布
         )
+        # 价差滚动统计（均值/波动/z-score/对冲比例），同一价差结构在同一lane上按序更新
+        self.spread_stats = SpreadStats(self.bus, window=300, halflife=60)
+        # 1s/5s/1m/5m的合约与价差K线
+        self.bar_aggregator = BarAggregator(self.bus)
+        # 行情tick落盘（data/ticks/合约/日期/）
+        self.tick_store = TickStore(self.bus)
         self.gui = TradingCluster(self.bus, leg1, leg2)
 
         # 绑定窗口关闭事件（关键修改点[4,5](@ref)）
@@ -48,11 +87,18 @@ class PairTradingSystem:
 
         # 断开IB连接（关键资源释放[1](@ref)）
         if self.md_service._connected:
-            self.md_service.disconnect()
+            self.md_service.shutdown()
             print("已断开IB连接")
 
         # 停止事件总线（关键线程终止[7](@ref)）
+        self.spread_calculator.close()
         self.bus.stop()
+        self.bar_aggregator.close()
+        self.tick_store.close()
+        print(f"已落盘tick: {self.tick_store.written}")
+        print(f"事件总线统计: {self.bus.stats()}")
+        print(f"行情配对统计: {self.md_service.matcher_stats()}")
+        print(f"价差发布统计: {self.spread_calculator.stats()}")
         print("所有资源已释放")
 
         # 线程状态检查（新增调试信息）
@@ -60,18 +106,18 @@ class PairTradingSystem:
         print(f"残留线程: {[t.name for t in active_threads if t != threading.main_thread()]}")
 
     def _connect_ib_with_retry(self, retries=3):
-        """带重试机制的IB连接"""
-        for attempt in range(1, retries + 1):
-            if self.md_service.connect_ib():
-                print(f"第{attempt}次连接IB成功")
-                time.sleep(2)
-                self.md_service.subscribe()
-                return True
-            print(f"第{attempt}次连接失败，{'' if attempt == retries else '5秒后重试...'}")
-            time.sleep(5)
+        """带重试机制的IB连接：握手完成（nextValidId）即订阅，失败按指数退避重试"""
+        if self.md_service.connect_with_retry(retries=retries, timeout=5.0):
+            self.md_service.subscribe()
+            for symbol in self.md_service.instruments:
+                self.md_service.subscribe_depth(symbol)
+            return True
+        print(f"{retries}次连接IB均失败")
         return False
 
 
 if __name__ == "__main__":
+    # 日志在入口处统一配置（级别取TRADESPREAD_LOG_LEVEL）
+    setup_logging()
     system = PairTradingSystem("GCJ5", "GCM5")
     system.start()
\ No newline at end of file
@@ -34,16 +34,11 @@ class TradingSystem:
         self.bus.stop()
 
     def _connect_ib(self):
-        """连接IB的带重试机制"""
-        retries = 3
-        for i in range(retries):
-            if self.md.connect_ib():
-                print("IB连接成功")
-                time.sleep(2)  # 等待初始化
-                self.md.subscribe()
-                return True
-            print(f"连接失败，剩余重试次数: {retries - i - 1}")
-            time.sleep(5)
+        """连接IB的带重试机制（握手完成即返回，失败按指数退避重试）"""
+        if self.md.connect_with_retry(retries=3):
+            print("IB连接成功")
+            self.md.subscribe()
+            return True
         return False
 
 